@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ms.backend
+from ms.objects import MValue
+from ms.startup import interpreter
+
+
+# Membership checks and subtyping of enums with thousands of values (say,
+# the label set of a classification oracle), with the hash index of their
+# values and with the linear comparisons used without one.
+#
+#   python benchmarks/enums.py [values]
+
+def per_call(count: int, call) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    ip.eval("let labels = []")
+    ip.eval(f'for let n in range(0, {size}) do push(labels, "label" + str(n)) end')
+    ip.eval('let Label = type Enum(Str, labels)')
+    ip.eval(f'let Common = type Enum(Str, slice(labels, 0, {size // 2}))')
+    checker = ip.checker
+    indexed = ip.eval("Label").definition
+    subset = ip.eval("Common").definition
+    linear = indexed.model_copy(update={"index": None})
+    linear_subset = subset.model_copy(update={"index": None})
+    env = ip.env
+    last = MValue(f"label{size - 1}", None)
+    missing = MValue("unknown", None)
+
+    print(f"enum of {size} values          indexed      linear")
+    for name, value in [("member (last value)", last), ("not a member", missing)]:
+        fast = per_call(1000, lambda: checker._checktype_recursion(value, indexed, env))
+        slow = per_call(10, lambda: checker._checktype_recursion(value, linear, env))
+        print(f"{name:<28}{fast:>8.1f}us{slow:>10.0f}us")
+    fast = per_call(100, lambda: checker._subtype_recursion(subset, indexed, env, env))
+    slow = per_call(1, lambda: checker._subtype_recursion(linear_subset, linear, env, env))
+    print(f"{'subtype (half the values)':<28}{fast:>8.1f}us{slow:>10.0f}us")
+
+
+if __name__ == "__main__":
+    main()
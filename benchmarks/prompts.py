@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ms.oracle
+import ms.backend
+from ms.objects import MValue
+from ms.startup import interpreter
+
+
+# Microseconds to assemble the prompt of a call to the language library's
+# ner oracle, with the default and the compact prompts.
+#
+#   python benchmarks/prompts.py [calls]
+
+def assemble(oracle, count: int) -> float:
+    args = [MValue("Alice flew from Paris to Rome on Monday.", None)]
+    oracle.prepare_prompt(args)
+    start = time.perf_counter()
+    for _ in range(count):
+        oracle.prepare_prompt(args)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    with open("ms/lib/lang.ms") as fh:
+        ip.eval(fh.read(), "ms/lib/lang.ms")
+    ner = ip.eval("ner")
+    for compact in [False, True]:
+        ms.oracle.configure(compact=compact)
+        print(f"{'compact' if compact else 'default':<8} {assemble(ner, count):.1f} us/prompt")
+
+
+if __name__ == "__main__":
+    main()
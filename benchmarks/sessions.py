@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+import requests
+import standin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ms.backend
+
+
+# Requests per second to a local stand-in server, with a new connection per
+# request and with the pooled keep-alive sessions.
+#
+#   python benchmarks/sessions.py [requests]
+
+def rate(count: int, call) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    server = standin.serve(reply="42")
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    data = backend.preprocess("Prompt", "root ::= [0-9]+")
+    unpooled = rate(count, lambda: requests.post(backend.url, **data).json())
+    pooled = rate(count, lambda: backend.consult("Prompt", "root ::= [0-9]+"))
+    print(f"without pooling: {unpooled:.0f} req/s")
+    print(f"pooled:          {pooled:.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import threading
+from typing import Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# A local stand-in for the oracle servers.
+#
+# Answers llama.cpp (/completion) and OpenAI (/v1/chat/completions)
+# requests after an optional latency, over keep-alive HTTP/1.1 connections,
+# and counts the requests. The reply is fixed, or computed from the request
+# by a function.
+#
+# With slots, it also emulates llama.cpp's prompt cache: each slot keeps the
+# last prompt it evaluated, and a request only evaluates the part of its
+# prompt after the prefix shared with its slot's (all of it without
+# cache_prompt), taking token_time seconds per token (4 characters). The
+# request goes to its id_slot, or else to the least recently used slot.
+# The replies report the tokens cached and evaluated, like llama.cpp's.
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffered, so that the headers and the body go out in one packet.
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        content = server.reply(request) if callable(server.reply) else server.reply
+        with server.lock:
+            server.requests += 1
+        timings = None
+        if server.slots is not None:
+            timings = evaluate(server, request)
+            time.sleep(timings["prompt_n"] * server.token_time)
+        if server.latency:
+            time.sleep(server.latency)
+        if self.path.startswith("/v1/"):
+            reply = {"choices": [{"message": {"content": content}}]}
+        else:
+            reply = {"content": content}
+        if timings is not None:
+            reply.update(id_slot=timings.pop("id_slot"), tokens_cached=timings.pop("tokens_cached"),
+                         timings=timings)
+        body = json.dumps(reply).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+
+# Picks the request's slot and the part of its prompt to evaluate, and
+# keeps the prompt in the slot.
+def evaluate(server: ThreadingHTTPServer, request: dict) -> dict:
+    prompt = request.get("prompt", "")
+    slot = request.get("id_slot")
+    with server.lock:
+        if type(slot) != int or not 0 <= slot < len(server.slots):
+            slot = server.used.index(min(server.used))
+        server.clock += 1
+        server.used[slot] = server.clock
+        cached = ""
+        if request.get("cache_prompt"):
+            cached = os.path.commonprefix([server.slots[slot], prompt])
+        server.slots[slot] = prompt
+        evaluated = (len(prompt) - len(cached)) // 4
+        server.evaluated += evaluated
+    return {"id_slot": slot, "tokens_cached": len(cached) // 4, "prompt_n": evaluated,
+            "prompt_ms": evaluated * server.token_time * 1000}
+
+
+def serve(port: int = 0, reply="null", latency: float = 0.0, slots: Optional[int] = None,
+          token_time: float = 0.0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.reply = reply
+    server.latency = latency
+    server.requests = 0
+    server.slots = None if slots is None else [""] * slots
+    server.used = [0] * (slots or 0)
+    server.clock = 0
+    server.token_time = token_time
+    server.evaluated = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server: ThreadingHTTPServer, path: str = "/completion") -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import random
+import standin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ms.backend
+from ms.objects import MValue
+from ms.startup import interpreter
+from ms.telemetry import percentile
+
+
+# Time to first token of oracle calls to a stand-in llama.cpp server that
+# emulates its prompt cache, with and without assigning each oracle a slot.
+# The calls go to four of the language library's oracles in random order,
+# one at a time, on a server with four slots. The stand-in generates the
+# reply instantly, so the time of a call is the time to its first token.
+#
+#   python benchmarks/ttft.py [calls] [ms per prompt token]
+
+ORACLES = ["ner", "pos", "coref", "keywords"]
+SLOTS = 4
+
+
+def queries(count: int) -> list:
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    with open("ms/lib/lang.ms") as fh:
+        ip.eval(fh.read(), "ms/lib/lang.ms")
+    oracles = [ip.eval(name) for name in ORACLES]
+    rng = random.Random(0)
+    result = []
+    for n in range(count):
+        text = MValue(f"Call number {n} of the benchmark went to {rng.choice(ORACLES)}.", None)
+        result.append(rng.choice(oracles).prepare_query([[text]]))
+    return result
+
+
+def run(queries: list, token_time: float, affinity: bool) -> tuple:
+    server = standin.serve(reply="null", slots=SLOTS, token_time=token_time)
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    backend.slots = SLOTS if affinity else None
+    times = []
+    try:
+        for prompt, grammar, schema, key, max_tokens, _ in queries:
+            start = time.perf_counter()
+            backend.consult(prompt, grammar, schema, affinity=key, max_tokens=max_tokens)
+            times.append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+    return times, server.evaluated / len(queries)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    token_time = (float(sys.argv[2]) if len(sys.argv) > 2 else 0.5) / 1000
+    calls = queries(count)
+    print(f"{'slots':<12}{'tokens':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for affinity in [False, True]:
+        times, tokens = run(calls, token_time, affinity)
+        print(f"{'per oracle' if affinity else 'server LRU':<12}{tokens:>8.0f}"
+              f"{1000 * sum(times) / len(times):>10.1f}{1000 * percentile(times, 0.5):>10.1f}"
+              f"{1000 * percentile(times, 0.95):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
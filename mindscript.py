@@ -4,7 +4,17 @@ import readline
 import argparse
 from ms.ast import IncompleteExpression, Return, Exit
 import ms.backend
+import ms.cache
+import ms.sessions
+import ms.reliability
+import ms.ratelimit
+import ms.replay
+import ms.oracle
+import ms.telemetry
+import ms.singleflight
+import ms.deferred
 import traceback
+import atexit
 
 GREEN = "\033[32m"
 BLUE = "\033[94m"
@@ -19,7 +29,9 @@ Use Control-D to exit.
 backends = [
     "llamacpp",
     "gpt35turbo",
-    "gpt4turbo"
+    "gpt4turbo",
+    "gpt4o",
+    "replay"
 ]
 
 def execute_file(filename: str, backend: ms.backend.Backend):
@@ -78,23 +90,148 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('filename', nargs='?', type=str, help='an optional filename to process', default=None)
     parser.add_argument('--backend', help=f"choose backend from {backends}")
+    parser.add_argument('--cache', action='store_true', help="cache oracle replies in memory")
+    parser.add_argument('--cache-file', help="also cache oracle replies in a SQLite file", default=None)
+    parser.add_argument('--cache-size', type=int, help="maximum number of cached replies", default=1024)
+    parser.add_argument('--cache-ttl', type=float, help="seconds until a cached reply expires", default=None)
+    parser.add_argument('--cache-refresh', action='store_true', help="ignore cached replies, but store new ones")
+    parser.add_argument('--temperature', type=float, help="sampling temperature of the oracle backend", default=None)
+    parser.add_argument('--cache-nondeterministic', action='store_true',
+                        help="also cache replies sampled with a positive temperature")
+    parser.add_argument('--pool-size', type=int, help="maximum number of kept-alive connections per host", default=None)
+    parser.add_argument('--stream', action='store_true', help="stream oracle replies, stopping once the value is complete")
+    parser.add_argument('--concurrency', type=int, help="maximum number of concurrent oracle requests in pmap", default=None)
+    parser.add_argument('--batch-size', type=int, help="number of oracle inputs packed into a request in pmap", default=None)
+    parser.add_argument('--timeout', type=float, help="seconds to wait for an oracle reply", default=None)
+    parser.add_argument('--budget', type=float, help="seconds per oracle call, including the retries", default=None)
+    parser.add_argument('--retries', type=int, help="number of retries after a transient failure", default=0)
+    parser.add_argument('--retry-delay', type=float, help="base delay in seconds of the exponential backoff", default=0.5)
+    parser.add_argument('--hedge', type=float, help="send a duplicate request after this percentile of the latencies (e.g. 0.95)", default=None)
+    parser.add_argument('--breaker', type=int, help="stop requests for a while after this many failures in a row", default=None)
+    parser.add_argument('--rpm', type=float, help="maximum number of oracle requests per minute", default=None)
+    parser.add_argument('--tpm', type=float, help="maximum number of (estimated) tokens per minute", default=None)
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adapt the number of concurrent requests to the observed latency and errors")
+    parser.add_argument('--endpoints', help="comma-separated llama.cpp URLs to balance the requests across", default=None)
+    parser.add_argument('--routing', choices=["least-outstanding", "latency"], default="least-outstanding",
+                        help="how requests are routed across the endpoints")
+    parser.add_argument('--no-pinning', action='store_true', help="don't route each oracle to the same endpoint")
+    parser.add_argument('--record', help="append the oracle requests and replies to a JSON Lines file", default=None)
+    parser.add_argument('--replay-file', help="file of recorded replies for the replay backend", default=None)
+    parser.add_argument('--replay-latency', default="none",
+                        help="simulated latency of the replay backend: none, recorded, fixed:S, "
+                             "uniform:A:B or lognormal:MEDIAN:SHAPE")
+    parser.add_argument('--replay-seed', type=int, help="random seed of the simulated latency", default=None)
+    parser.add_argument('--examples-top-k', type=int, help="only include the k examples most relevant to the input", default=None)
+    parser.add_argument('--compact-prompts', action='store_true',
+                        help="minify the schemas and values in the oracle prompts, and state the task once")
+    parser.add_argument('--prompt-budget', type=int, help="only include as many examples as fit in this many tokens", default=None)
+    parser.add_argument('--slots', type=int, help="number of slots of the llama.cpp server(s), to assign one per oracle", default=None)
+    parser.add_argument('--no-prompt-cache', action='store_true', help="don't let llama.cpp reuse the evaluated prompts")
+    parser.add_argument('--structured', choices=["auto", "on", "off"], default="auto",
+                        help="constrain OpenAI replies to the output's JSON schema (auto: if the model supports it)")
+    parser.add_argument('--coalesce', action='store_true', help="share the reply of a request with the identical requests in flight")
+    parser.add_argument('--stats-file', help="write the oracle statistics to a JSON file at exit", default=None)
+    parser.add_argument('--lazy', action='store_true', help="defer oracle calls until their outputs are used, submitting them in batches")
+    parser.add_argument('--lazy-batch', type=int, help="number of deferred oracle calls that triggers their submission", default=64)
+    parser.add_argument('--max-wait', type=float, help="seconds a deferred oracle call can wait for its submission", default=None)
+    parser.add_argument('--max-tokens', type=int, help="limit on the tokens of the replies of unbounded output types", default=None)
     args = parser.parse_args()
 
     if args.backend is not None and args.backend not in backends:
         print(f"Unknown backend: {args.backend}")
         exit(2)
     
-    if args.backend is None or args.backend == "llamacpp":
+    if args.endpoints is not None and args.backend not in [None, "llamacpp"]:
+        print("Endpoints can only be given for the llamacpp backend.")
+        exit(2)
+
+    if args.endpoints is not None:
+        args.backend = "llamacpp"
+        backend = ms.backend.LlamaCPPPool(args.endpoints.split(","), routing=args.routing,
+                                          pinning=not args.no_pinning)
+    elif args.backend is None or args.backend == "llamacpp":
         args.backend = "llamacpp"
         backend = ms.backend.LlamaCPP()
     elif args.backend == "gpt35turbo":
         backend = ms.backend.GPT3Turbo()
     elif args.backend == "gpt4turbo":
         backend = ms.backend.GPT4Turbo()
+    elif args.backend == "gpt4o":
+        backend = ms.backend.GPT4o()
+    elif args.backend == "replay":
+        if args.replay_file is None:
+            print("The replay backend needs a --replay-file.")
+            exit(2)
+        backend = ms.backend.Replay(args.replay_file, latency=args.replay_latency, seed=args.replay_seed)
     else:
         backend = ms.backend.LlamaCPP()
     WELCOME = WELCOME.format(backend=args.backend)
 
+    backend.stream = args.stream
+    if isinstance(backend, ms.backend.LlamaCPP):
+        backend.slots = args.slots
+        backend.cache_prompt = not args.no_prompt_cache
+
+    if args.concurrency is not None:
+        backend.concurrency = args.concurrency
+
+    if args.batch_size is not None:
+        backend.batch_size = args.batch_size
+
+    if args.max_tokens is not None:
+        backend.max_tokens = args.max_tokens
+    if isinstance(backend, ms.backend.OpenAIChat) and args.structured != "auto":
+        backend.structured = args.structured == "on"
+
+    if args.temperature is not None:
+        backend.temperature = args.temperature
+
+    if args.timeout is not None:
+        backend.timeout = args.timeout
+    backend.budget = args.budget
+    if args.retries > 0:
+        backend.retry = ms.reliability.RetryPolicy(retries=args.retries, base_delay=args.retry_delay)
+    if args.hedge is not None:
+        backend.hedging = ms.reliability.Hedging(percentile=args.hedge)
+    if args.breaker is not None:
+        backend.breaker = ms.reliability.CircuitBreaker(threshold=args.breaker)
+
+    if args.rpm is not None or args.tpm is not None:
+        backend.limiter = ms.ratelimit.RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    if args.adaptive:
+        backend.controller = ms.ratelimit.ConcurrencyController(
+            initial=min(4, backend.concurrency), maximum=backend.concurrency)
+
+    if args.coalesce:
+        backend.singleflight = ms.singleflight.SingleFlight()
+        ms.telemetry.registry.sections["singleFlight"] = backend.singleflight.stats
+
+    if args.record is not None:
+        backend.recorder = ms.replay.Recorder(args.record)
+
+    scheduler = None
+    if args.lazy:
+        scheduler = ms.deferred.Scheduler(flush_size=args.lazy_batch, max_wait=args.max_wait)
+    ms.oracle.configure(top_k=args.examples_top_k, budget=args.prompt_budget, scheduler=scheduler,
+                        compact=args.compact_prompts)
+
+    if args.stats_file is not None:
+        atexit.register(ms.telemetry.registry.dump, args.stats_file)
+
+    if args.pool_size is not None:
+        ms.sessions.configure(pool_size=args.pool_size)
+
+    if args.cache or args.cache_file is not None:
+        backend.cache = ms.cache.ResponseCache(
+            maxsize=args.cache_size, ttl=args.cache_ttl, path=args.cache_file,
+            maxsize_disk=args.cache_size if args.cache_file is not None else None,
+            nondeterministic=args.cache_nondeterministic)
+        backend.cache.refresh = args.cache_refresh
+        if not backend.cache.cacheable(backend):
+            print("Warning: Oracle replies are only cached with --temperature 0 or --cache-nondeterministic.",
+                  file=sys.stderr)
+
     # Check if filename is provided as command-line argument
     if args.filename:
         execute_file(args.filename, backend)
@@ -314,6 +314,7 @@ class TypeEnum(TypeExpr):
     type_expr: TypeExpr
     values_expr: Expr
     values: Optional[Any] = None
+    index: Optional[Any] = None
 
     def accept(self, visitor, **kwargs):
         return visitor.type_enum(self, **kwargs)
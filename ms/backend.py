@@ -1,17 +1,61 @@
 import os
+import time
+import random
+import threading
 import requests
 import json
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import OrderedDict
+from typing import Optional, List
+from urllib.parse import urlsplit
 from ms.objects import MValue
+from ms.cache import ResponseCache
+from ms.streaming import ValueScanner
+from ms.reliability import TransientError, RetryPolicy, CircuitBreaker, Hedging
+from ms.ratelimit import RateLimiter, ConcurrencyController
+from ms.telemetry import OracleStats
+from ms.singleflight import SingleFlight
+import ms.sessions
+import ms.replay
+import ms.schema
 
 
 TIMEOUT = 20
+CONCURRENCY = 8
+BATCH_SIZE = 1
+MAX_ASSIGNMENTS = 1024
 
 class Backend:
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    cache: Optional[ResponseCache] = None
+    concurrency: int = CONCURRENCY
+    batch_size: int = BATCH_SIZE
+    stream: bool = False
+    # Seconds per request, and optionally per call including the retries.
+    timeout: float = TIMEOUT
+    budget: Optional[float] = None
+    retry: Optional[RetryPolicy] = None
+    breaker: Optional[CircuitBreaker] = None
+    hedging: Optional[Hedging] = None
+    limiter: Optional[RateLimiter] = None
+    controller: Optional[ConcurrencyController] = None
+    recorder: Optional[ms.replay.Recorder] = None
+    singleflight: Optional[SingleFlight] = None
+    # The default limit on the tokens of a reply.
+    max_tokens: Optional[int] = None
+
+    # Backends hold locks and connection pools, and are shared by the copies
+    # of the functions that use them (e.g. partial applications).
+    def __deepcopy__(self, memo):
+        return self
+
     # Must return a dict {"headers": dict, "json": dict}
-    # to be submitted as an HTTP request.
+    # to be submitted as an HTTP request. The reply is limited to max_tokens
+    # tokens, or to the backend's default if None.
     @abstractmethod
-    def preprocess(self, prompt: str, output_grammar: str):
+    def preprocess(self, prompt: str, output_grammar: str, max_tokens: Optional[int] = None):
         pass
 
     # Must return a string ready to be parsed by the interpreter.
@@ -19,33 +63,253 @@ class Backend:
     def postprocess(self, jsonobj: dict):
         pass
 
-    def consult(self, prompt: str, output_grammar: str):
+    # Must return the text contained in a chunk of a streamed reply.
+    @abstractmethod
+    def postprocess_chunk(self, jsonobj: dict):
+        pass
+
+    # Returns the number of tokens used by a request, if reported.
+    def usage(self, jsonobj: dict) -> Optional[int]:
+        return None
+
+    # A rough estimate of the tokens used by a request, for rate limiting.
+    def estimate_tokens(self, prompt: str, max_tokens: Optional[int] = None) -> int:
+        return len(prompt) // 4 + (max_tokens or self.max_tokens or 0)
+
+    # The deadline is an absolute time.monotonic() time by which the call
+    # must be done. It defaults to the backend's budget, if any. Requests
+    # with the same affinity key may be routed to the same server.
+    def consult(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        start = time.monotonic()
+        if self.budget is not None:
+            deadline = start + self.budget if deadline is None else min(deadline, start + self.budget)
+        cache = self.cache
+        if cache is None or not cache.cacheable(self):
+            code = self.coalesce(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+        else:
+            key = cache.key(self, prompt, output_grammar, output_schema, max_tokens)
+            code = cache.get(key)
+            if code is None:
+                code = self.coalesce(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+                if code is not None:
+                    cache.put(key, code)
+            elif stats is not None:
+                stats.record_cache_hit()
+        return code
+
+    # Consults a list of (prompt, output_grammar, output_schema, affinity, max_tokens,
+    # stats) queries (the last ones being optional) with
+    # at most `concurrency` requests in flight. Returns the replies in order,
+    # with the ValueError in place of the reply for the queries that failed.
+    def consult_many(self, queries: list, concurrency: Optional[int] = None,
+                     deadline: Optional[float] = None) -> list:
+        if concurrency is None:
+            concurrency = self.concurrency
+
+        def attempt(query):
+            prompt, output_grammar, output_schema, *rest = query
+            options = dict(zip(["affinity", "max_tokens", "stats"], rest))
+            try:
+                return self.consult(prompt, output_grammar, output_schema, deadline=deadline, **options)
+            except ValueError as e:
+                return e
+
+        if concurrency <= 1 or len(queries) <= 1:
+            return [attempt(query) for query in queries]
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(queries))) as executor:
+            return list(executor.map(attempt, queries))
+
+    # Requests a reply, unless an identical request is in flight, in which
+    # case its reply is shared.
+    def coalesce(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                 deadline: Optional[float] = None, affinity: Optional[str] = None,
+                 max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        if self.singleflight is None:
+            return self.measure(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+        code, shared = self.singleflight.do(
+            ms.replay.key(prompt, output_grammar),
+            lambda: self.measure(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats),
+            deadline)
+        if shared and stats is not None:
+            stats.record_coalesced()
+        return code
+
+    # Requests a reply, and records the request (with its retries) in the
+    # oracle's statistics and with the recorder. Cache hits and coalesced
+    # calls send no request, so they aren't recorded.
+    def measure(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        start = time.monotonic()
+        try:
+            code = self.attempt(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+        except ValueError:
+            if stats is not None:
+                stats.record_request(time.monotonic() - start, prompt, None)
+            raise
+        latency = time.monotonic() - start
+        if self.recorder is not None:
+            self.recorder.record(prompt, output_grammar, code, latency)
+        if stats is not None:
+            stats.record_request(latency, prompt, code)
+        return code
+
+    # Requests a reply, retrying transient failures.
+    def attempt(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        delays = self.retry.delays() if self.retry is not None else iter(())
+        while True:
+            if self.breaker is not None and not self.breaker.allow():
+                raise TransientError(f"Error: Too many failures for {self.url}")
+            try:
+                code = self.hedge(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+            except TransientError:
+                if self.breaker is not None:
+                    self.breaker.failure()
+                delay = next(delays, None)
+                if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+                    raise
+                if stats is not None:
+                    stats.record_retry()
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release()
+                raise
+            if self.breaker is not None:
+                self.breaker.success()
+            return code
+
+    # Requests a reply, sending a duplicate request if the first one takes
+    # longer than the hedging threshold. The first reply wins.
+    def hedge(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+              deadline: Optional[float] = None, affinity: Optional[str] = None,
+              max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        threshold = self.hedging.threshold() if self.hedging is not None else None
+        if threshold is None:
+            return self.request(prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            args = (prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+            pending = {executor.submit(self.request, *args)}
+            done, pending = wait(pending, timeout=threshold)
+            if not done:
+                self.hedging.hedged += 1
+                pending.add(executor.submit(self.request, *args))
+            while True:
+                if not done:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                if future.exception() is None or not (pending or done):
+                    return future.result()
+        finally:
+            # The slower request can't be interrupted, so it is left to finish.
+            executor.shutdown(wait=False)
+
+    def request(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        return self.send(self.url, prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+
+    # The options are added to the JSON body of the request.
+    def send(self, url: str, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+             deadline: Optional[float] = None, affinity: Optional[str] = None,
+             max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None,
+             options: Optional[dict] = None):
         # print(f"Backend.consult: prompt = {prompt}")
-        url = self.url
-        data = self.preprocess(prompt, output_grammar)
+        estimate = self.estimate_tokens(prompt, max_tokens)
+        if self.controller is not None:
+            self.controller.acquire(deadline)
+        start = None
+        congested = False
         try:
-            with requests.post(url, timeout=TIMEOUT, **data) as response:
-                res = response.json()
-                # print(f"Backend.consult: res = {res}")
-                code = self.postprocess(res)
+            if self.limiter is not None:
+                self.limiter.acquire(estimate, deadline)
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise ValueError(f"Error: Deadline exceeded for {url}")
+            data = self.preprocess(prompt, output_grammar, max_tokens)
+            if options is not None:
+                data["json"].update(options)
+            if self.stream:
+                data["json"]["stream"] = True
+            start = time.monotonic()
+            with ms.sessions.get(url).post(url, timeout=timeout, stream=self.stream, **data) as response:
+                if self.limiter is not None:
+                    self.limiter.update(response.headers)
+                if response.status_code == 429 or response.status_code >= 500:
+                    congested = True
+                    raise TransientError(f"Error: HTTP status {response.status_code} for {url}")
+                if self.stream:
+                    response.raise_for_status()
+                    code = self.read_stream(response, ValueScanner(output_schema))
+                else:
+                    res = response.json()
+                    # print(f"Backend.consult: res = {res}")
+                    code = self.postprocess(res)
+                    used = self.usage(res)
+                    if self.limiter is not None and used is not None:
+                        self.limiter.settle(estimate, used)
+                    if stats is not None and used is not None:
+                        stats.record_tokens(used)
         except json.JSONDecodeError as e:
             raise ValueError(f"Error: JSON decode failure of {response.text}")
         except requests.ConnectionError as e:
-            raise ValueError(f"Error: Connection for {url}")
+            raise TransientError(f"Error: Connection for {url}")
         except requests.Timeout as e:
-            raise ValueError(f"Error: Timeout for {url}")
+            congested = True
+            raise TransientError(f"Error: Timeout for {url}")
         except requests.HTTPError as e:
             raise ValueError(f"Error: HTTP error for {url}")
         except requests.exceptions.RequestException as e:
             raise ValueError(f"Error: Unknown request error for {url}")
         except KeyError as e:
             raise ValueError(f"Error: Unexpected reply: {res}")
+        finally:
+            if self.controller is not None:
+                latency = None if start is None else time.monotonic() - start
+                self.controller.release(latency, congested)
+        if self.hedging is not None:
+            self.hedging.record(time.monotonic() - start)
         return code
 
+    # Reads server-sent events until the scanner has a complete value. The
+    # connection is then closed, which stops the generation.
+    def read_stream(self, response: requests.Response, scanner: ValueScanner):
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[len(b"data:"):].strip()
+            if payload == b"[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+                text = self.postprocess_chunk(chunk)
+            except (json.JSONDecodeError, KeyError, IndexError):
+                raise ValueError(f"Error: Unexpected reply: {payload.decode('utf-8', 'replace')}")
+            code = scanner.feed(text)
+            if code is not None:
+                return code
+        return scanner.finish()
 
-class GPT3Turbo(Backend):
-    def __init__(self):
-        self.url = "https://api.openai.com/v1/chat/completions"
+
+# OpenAI's chat completions API. With structured outputs, the reply is
+# constrained to the output's JSON schema (see ms.schema.strict_schema).
+# Only the newer models support them, so they are enabled by model name.
+
+STRUCTURED_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+
+class OpenAIChat(Backend):
+    def __init__(self, model: str):
+        base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.url = base_url.rstrip("/") + "/chat/completions"
         if "OPENAI_API_KEY" not in os.environ:
             raise ValueError(
                 "The environment variable 'OPENAI_API_KEY' is not set.")
@@ -53,46 +317,68 @@ class GPT3Turbo(Backend):
             "Content-Type": "application/json",
             "Authorization": "Bearer " + os.environ["OPENAI_API_KEY"]
         }
+        self.model = model
         self.temperature = 0.7
+        self.max_tokens = 1000
+        self.structured = model.startswith(STRUCTURED_MODELS)
 
-    def preprocess(self, prompt: str, output_grammar: str):
+    def preprocess(self, prompt: str, output_grammar: str, max_tokens: Optional[int] = None):
         return {
             "headers": self.headers,
             "json": {
-                "model": "gpt-3.5-turbo",
+                "model": self.model,
                 "messages": [{"role": "user", "content": prompt}],
-                "temperature": self.temperature
+                "temperature": self.temperature,
+                "max_tokens": max_tokens or self.max_tokens
             }
         }
 
     def postprocess(self, res: dict):
-        return res["choices"][0]["message"]["content"]
+        content = res["choices"][0]["message"]["content"]
+        # Refusals have no content.
+        if content is None:
+            raise KeyError("content")
+        return content
+
+    def postprocess_chunk(self, res: dict):
+        return res["choices"][0]["delta"].get("content") or ""
 
+    def usage(self, res: dict):
+        return res.get("usage", {}).get("total_tokens")
+
+    def send(self, url: str, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+             deadline: Optional[float] = None, affinity: Optional[str] = None,
+             max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None,
+             options: Optional[dict] = None):
+        schema = None
+        if self.structured and output_schema is not None:
+            schema = ms.schema.strict_schema(output_schema)
+        if schema is None:
+            return super().send(url, prompt, output_grammar, output_schema, deadline, affinity,
+                                max_tokens, stats, options)
+        response_format = {"type": "json_schema", "json_schema": {"name": "output", "strict": True, "schema": schema}}
+        options = dict(options or {}, response_format=response_format)
+        code = super().send(url, prompt, output_grammar, json.dumps(schema), deadline, affinity,
+                            max_tokens, stats, options)
+        try:
+            return ms.schema.unwrap_output(output_schema, code)
+        except (json.JSONDecodeError, KeyError, TypeError):
+            raise ValueError(f"Error: Unexpected reply: {code}")
 
-class GPT4Turbo(Backend):
+
+class GPT3Turbo(OpenAIChat):
     def __init__(self):
-        self.url = "https://api.openai.com/v1/chat/completions"
-        if "OPENAI_API_KEY" not in os.environ:
-            raise ValueError(
-                "The environment variable 'OPENAI_API_KEY' is not set.")
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + os.environ["OPENAI_API_KEY"]
-        }
-        self.temperature = 0.7
+        super().__init__("gpt-3.5-turbo")
 
-    def preprocess(self, prompt: str, output_grammar: str):
-        return {
-            "headers": self.headers,
-            "json": {
-                "model": "gpt-4-turbo",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": self.temperature
-            }
-        }
 
-    def postprocess(self, res: dict):
-        return res["choices"][0]["message"]["content"]
+class GPT4Turbo(OpenAIChat):
+    def __init__(self):
+        super().__init__("gpt-4-turbo")
+
+
+class GPT4o(OpenAIChat):
+    def __init__(self):
+        super().__init__("gpt-4o")
 
 
 class LlamaCPP(Backend):
@@ -101,17 +387,248 @@ class LlamaCPP(Backend):
         self.headers = {"Content-Type": "application/json"}
         self.max_tokens = 1000
         self.repeat_penalty = 1.5
+        # The server keeps the last prompt of each slot, and only evaluates
+        # the part of a new prompt that differs. If the number of slots is
+        # known, each oracle is assigned a slot so that its prefix is reused.
+        self.cache_prompt = True
+        self.slots = None
+        self.slot_assignments = OrderedDict()
+        self.busy = set()
+        self.slot_lock = threading.Lock()
 
-    def preprocess(self, prompt: str, output_grammar: str):
-        return {
+    def preprocess(self, prompt: str, output_grammar: str, max_tokens: Optional[int] = None):
+        data = {
             "headers": self.headers,
             "json": {
                 "prompt": prompt,
                 "grammar": output_grammar,
-                "n_predit": self.max_tokens,
-                "repeat_penalty": self.repeat_penalty
+                "n_predict": max_tokens or self.max_tokens,
+                "repeat_penalty": self.repeat_penalty,
+                "cache_prompt": self.cache_prompt
             }
         }
+        # Otherwise the server's default applies.
+        if self.temperature is not None:
+            data["json"]["temperature"] = self.temperature
+        return data
 
     def postprocess(self, res: dict):
         return res["content"]
+
+    def postprocess_chunk(self, res: dict):
+        return res["content"]
+
+    def usage(self, res: dict):
+        if "tokens_evaluated" not in res or "tokens_predicted" not in res:
+            return None
+        return res["tokens_evaluated"] + res["tokens_predicted"]
+
+    # Returns the slot assigned to the affinity key, or None if there is no
+    # assignment or the slot is busy with a request of ours, in which case
+    # the server picks a free one.
+    def acquire_slot(self, url: str, affinity: Optional[str]) -> Optional[int]:
+        if self.slots is None or affinity is None:
+            return None
+        with self.slot_lock:
+            slot = self.slot_assignments.get(affinity)
+            if slot is None:
+                # New keys go to the slot with the fewest keys.
+                counts = [0] * self.slots
+                for assigned in self.slot_assignments.values():
+                    counts[assigned] += 1
+                slot = counts.index(min(counts))
+                self.slot_assignments[affinity] = slot
+                if len(self.slot_assignments) > MAX_ASSIGNMENTS:
+                    self.slot_assignments.popitem(last=False)
+            if (url, slot) in self.busy:
+                return None
+            self.busy.add((url, slot))
+            return slot
+
+    def release_slot(self, url: str, slot: Optional[int]):
+        if slot is not None:
+            with self.slot_lock:
+                self.busy.discard((url, slot))
+
+    def send(self, url: str, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+             deadline: Optional[float] = None, affinity: Optional[str] = None,
+             max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None,
+             options: Optional[dict] = None):
+        slot = self.acquire_slot(url, affinity)
+        if slot is not None:
+            options = dict(options or {}, id_slot=slot)
+        try:
+            return super().send(url, prompt, output_grammar, output_schema, deadline, affinity,
+                                max_tokens, stats, options)
+        finally:
+            self.release_slot(url, slot)
+
+
+class Replay(Backend):
+    def __init__(self, path: str, latency: str = "none", seed: Optional[int] = None):
+        self.url = f"replay:{path}"
+        self.records = {}
+        for record in ms.replay.load(path):
+            key = ms.replay.key(record["prompt"], record["grammar"])
+            self.records.setdefault(key, []).append(record)
+        self.latency = ms.replay.latency_model(latency, seed)
+        # Prompts recorded several times are answered in turn.
+        self.served = {}
+        self.lock = threading.Lock()
+
+    def request(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        key = ms.replay.key(prompt, output_grammar)
+        records = self.records.get(key)
+        if records is None:
+            raise ValueError(f"Error: No recorded reply for the prompt in {self.url}")
+        with self.lock:
+            count = self.served.get(key, 0)
+            self.served[key] = count + 1
+        record = records[count % len(records)]
+        delay = self.latency(record.get("latency", 0.0))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            raise TransientError(f"Error: Timeout for {self.url}")
+        time.sleep(delay)
+        return record["reply"]
+
+
+# A pool of llama.cpp servers.
+#
+# Each request goes to the healthy server with the fewest outstanding
+# requests ("least-outstanding"), or to a random server weighted by its
+# speed and load ("latency"). A server is ejected from the pool after
+# several failures in a row, and reinstated once its /health endpoint
+# answers again. With pinning, requests with the same affinity key (e.g.
+# those of the same oracle) go to the same server, keeping its prompt cache
+# warm, unless that server is much busier than the others.
+
+class Endpoint():
+
+    def __init__(self, url: str):
+        self.url = url
+        parts = urlsplit(url)
+        self.health_url = f"{parts.scheme}://{parts.netloc}/health"
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejected = False
+        self.requests = 0
+
+
+class LlamaCPPPool(LlamaCPP):
+    def __init__(self, urls: List[str], routing: str = "least-outstanding", pinning: bool = True,
+                 eject_after: int = 3, health_interval: float = 5.0, spill: int = 2):
+        super().__init__()
+        if len(urls) == 0:
+            raise ValueError("The pool needs at least one endpoint.")
+        if routing not in ["least-outstanding", "latency"]:
+            raise ValueError(f"Unknown routing: {routing}")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.url = urls[0]
+        self.routing = routing
+        self.pinning = pinning
+        self.eject_after = eject_after
+        self.health_interval = health_interval
+        self.spill = spill
+        self.assignments = OrderedDict()
+        self.lock = threading.Lock()
+        self.checker = None
+
+    def choose(self, affinity: Optional[str] = None) -> Endpoint:
+        with self.lock:
+            candidates = [endpoint for endpoint in self.endpoints if not endpoint.ejected]
+            if not candidates:
+                raise TransientError("Error: No healthy endpoint in the pool")
+            least = min(endpoint.outstanding for endpoint in candidates)
+            if self.pinning and affinity is not None:
+                pinned = self.assignments.get(affinity)
+                if pinned is None or pinned.ejected:
+                    # New keys go to the server with the fewest keys.
+                    pinned = min(candidates, key=lambda endpoint: (
+                        sum(1 for assigned in self.assignments.values() if assigned is endpoint),
+                        endpoint.outstanding))
+                    self.assignments[affinity] = pinned
+                    if len(self.assignments) > MAX_ASSIGNMENTS:
+                        self.assignments.popitem(last=False)
+                if pinned.outstanding - least < self.spill:
+                    chosen = pinned
+                    chosen.outstanding += 1
+                    return chosen
+            if self.routing == "latency":
+                known = [endpoint.latency for endpoint in candidates if endpoint.latency is not None]
+                fastest = min(known) if known else 1.0
+                weights = [1.0 / ((endpoint.latency or fastest) * (endpoint.outstanding + 1))
+                           for endpoint in candidates]
+                chosen = random.choices(candidates, weights=weights)[0]
+            else:
+                chosen = min(candidates, key=lambda endpoint: (endpoint.outstanding, endpoint.requests))
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, endpoint: Endpoint, latency: Optional[float], failed: bool):
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if failed:
+                endpoint.failures += 1
+                if endpoint.failures >= self.eject_after and not endpoint.ejected:
+                    endpoint.ejected = True
+                    self.start_checker()
+                return
+            endpoint.failures = 0
+            if latency is not None:
+                # Exponentially weighted moving average.
+                endpoint.latency = latency if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * latency
+
+    def request(self, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+                deadline: Optional[float] = None, affinity: Optional[str] = None,
+                max_tokens: Optional[int] = None, stats: Optional[OracleStats] = None):
+        endpoint = self.choose(affinity)
+        start = time.monotonic()
+        try:
+            code = self.send(endpoint.url, prompt, output_grammar, output_schema, deadline, affinity, max_tokens, stats)
+        except TransientError:
+            self.release(endpoint, None, True)
+            raise
+        except ValueError:
+            self.release(endpoint, None, False)
+            raise
+        self.release(endpoint, time.monotonic() - start, False)
+        return code
+
+    def healthy(self, endpoint: Endpoint) -> bool:
+        try:
+            with ms.sessions.get(endpoint.health_url).get(endpoint.health_url, timeout=self.timeout) as response:
+                return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    # Checks the ejected servers periodically, until all of them are back.
+    def start_checker(self):
+        if self.checker is not None and self.checker.is_alive():
+            return
+
+        def check():
+            while True:
+                time.sleep(self.health_interval)
+                with self.lock:
+                    ejected = [endpoint for endpoint in self.endpoints if endpoint.ejected]
+                if not ejected:
+                    return
+                for endpoint in ejected:
+                    if self.healthy(endpoint):
+                        with self.lock:
+                            endpoint.ejected = False
+                            endpoint.failures = 0
+
+        self.checker = threading.Thread(target=check, daemon=True)
+        self.checker.start()
+
+    def stats(self) -> list:
+        with self.lock:
+            return [{"url": endpoint.url, "outstanding": endpoint.outstanding,
+                     "requests": endpoint.requests, "latency": endpoint.latency,
+                     "ejected": endpoint.ejected} for endpoint in self.endpoints]
@@ -1,6 +1,7 @@
 import re
 import ms.ast as ast
 from ms.objects import MType
+from ms.typecache import cache
 from pydantic import BaseModel
 
 # GRAMMAR = r"""
@@ -123,10 +124,14 @@ class BNFFormatter():
 
     def __init__(self, interpreter):
         self.interpreter = interpreter
+        self.tags = {}
 
-    # TODO: Rewrites memory addresses as 5 digit hexadecimals - it won't guarantee uniqueness.
+    # Numbers the nodes in the order they are visited, so that the same type
+    # always gives the same grammar (which is used as a cache key).
     def tag(self, obj):
-        return hex(id(obj) % 99989)[2:]
+        if id(obj) not in self.tags:
+            self.tags[id(obj)] = len(self.tags)
+        return str(self.tags[id(obj)])
 
     def type_definition(self, node, env=None, ids=None):
         # Should not be called!
@@ -215,7 +220,7 @@ class BNFFormatter():
             txt = self.interpreter.printer.shorten(txt)
             txt = r'"' + re.sub(r'"', r'\"', txt) + r'"'
             subs.append(txt)
-        body = f'{head} ::= ' + '| '.join(subs)
+        body = f'{head} ::= ' + '| '.join(subs) + '\n'
         return BNFRule(id=head, rule=body)
 
     def type_array(self, node, env=None, ids=None):
@@ -253,6 +258,10 @@ class BNFFormatter():
         # print(f"BNFFormatter.format: value.definition = {value.definition}")
         if type(value) != MType:
             return None
+        return cache.get("grammar", value, self._format)
+
+    def _format(self, value):
+        self.tags = {}
         bnf = value.definition.accept(self, env=value.environment, ids=dict())
         grammar = f'root ::= {bnf.id}\n{bnf.rule}' + GRAMMAR
         # print("Grammar:\n" + repr(grammar))
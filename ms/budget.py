@@ -0,0 +1,114 @@
+import re
+import json
+from typing import Optional
+import ms.ast as ast
+from ms.objects import MType
+
+
+# Output token budgets of the oracles.
+#
+# The budget of an output type is a bound on the length of its JSON
+# representation, counting a token per character (tokens are never shorter
+# than a character), or None if the length is unbounded (strings, arrays,
+# Any and recursive types). A budget can also be given in an annotation of
+# the oracle or the type, as in "# Writes a haiku. Max tokens: 60."
+
+SLACK = 16
+
+PATTERN = re.compile(r"max(?:imum)?[ _-]?tokens\s*[:=]?\s*(\d+)", re.IGNORECASE)
+
+LENGTHS = {"Null": 4, "Bool": 5, "Int": 20, "Num": 24}
+
+
+def from_annotation(annotation: Optional[str]) -> Optional[int]:
+    if annotation is None:
+        return None
+    match = PATTERN.search(annotation)
+    return int(match.group(1)) if match else None
+
+
+class Length():
+
+    def __init__(self):
+        self.visiting = []
+
+    def annotated(self, node) -> Optional[int]:
+        return from_annotation(node.annotation)
+
+    def type_definition(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_annotation(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_terminal(self, node, env=None):
+        override = self.annotated(node)
+        if override is not None:
+            return override
+        if node.token.ttype == ast.TokenType.ID:
+            value = env.get(node.token.literal)
+            if type(value) != MType or id(value.definition) in self.visiting:
+                return None
+            self.visiting.append(id(value.definition))
+            length = value.definition.accept(self, env=value.environment)
+            self.visiting.pop()
+            return length
+        return LENGTHS.get(node.token.literal)
+
+    def type_grouping(self, node, env=None):
+        override = self.annotated(node)
+        return override if override is not None else node.expr.accept(self, env=env)
+
+    def type_unary(self, node, env=None):
+        override = self.annotated(node)
+        if override is not None:
+            return override
+        length = node.expr.accept(self, env=env)
+        return None if length is None else max(length, LENGTHS["Null"])
+
+    def type_binary(self, node, env=None):
+        return self.annotated(node)
+
+    def type_enum(self, node, env=None):
+        override = self.annotated(node)
+        if override is not None:
+            return override
+        values = node.values.unwrap()
+        if not values:
+            return None
+        return max(len(json.dumps(value)) for value in values)
+
+    def type_array(self, node, env=None):
+        return self.annotated(node)
+
+    def type_map(self, node, env=None):
+        override = self.annotated(node)
+        if override is not None:
+            return override
+        length = 2
+        for key, expr in node.map.items():
+            item = expr.accept(self, env=env)
+            if item is None:
+                return None
+            length += len(json.dumps(key)) + item + 4
+        return length
+
+
+# The budget for an output of the type, or None if it is unbounded.
+def output_tokens(value: MType) -> Optional[int]:
+    override = from_annotation(value.definition.annotation)
+    if override is not None:
+        return override
+    try:
+        length = value.definition.accept(Length(), env=value.environment)
+    except (KeyError, ValueError):
+        return None
+    return None if length is None else length + SLACK
+
+
+# The budget for an array of outputs. Unbounded outputs get the default
+# (the backend's limit for a single reply) each.
+def batch_tokens(tokens: Optional[int], count: int, default: Optional[int] = None) -> Optional[int]:
+    if tokens is None:
+        tokens = default
+    return None if tokens is None else count * (tokens + 2) + SLACK
@@ -0,0 +1,127 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+# Oracle response cache.
+#
+# Replies are cached in memory (LRU) and optionally in a SQLite file, keyed
+# by a hash of everything that shapes the request: the backend class, model,
+# temperature, normalized prompt, output grammar and schema, and the limit
+# on the reply's tokens. Replies of backends sampling with a positive (or unknown)
+# temperature are only cached if explicitly allowed.
+
+class ResponseCache():
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None,
+                 path: Optional[str] = None, maxsize_disk: Optional[int] = None,
+                 nondeterministic: bool = False):
+        self.maxsize = maxsize
+        self.maxsize_disk = maxsize_disk
+        self.ttl = ttl
+        self.path = path
+        self.nondeterministic = nondeterministic
+        # Bypass: neither read nor write. Refresh: don't read, but write.
+        self.bypass = False
+        self.refresh = False
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses "
+                            "(key TEXT PRIMARY KEY, timestamp REAL, reply TEXT)")
+            self.db.commit()
+
+    def normalize(self, prompt: str) -> str:
+        lines = [line.rstrip() for line in prompt.strip().splitlines()]
+        return "\n".join(lines)
+
+    def key(self, backend, prompt: str, output_grammar: str, output_schema: Optional[str] = None,
+            max_tokens: Optional[int] = None) -> str:
+        data = {
+            "backend": type(backend).__name__,
+            "model": getattr(backend, "model", None),
+            "temperature": getattr(backend, "temperature", None),
+            "structured": getattr(backend, "structured", None),
+            "maxTokens": max_tokens if max_tokens is not None else getattr(backend, "max_tokens", None),
+            "prompt": self.normalize(prompt),
+            "grammar": output_grammar,
+            "schema": output_schema
+        }
+        encoded = json.dumps(data, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def cacheable(self, backend) -> bool:
+        if self.bypass:
+            return False
+        temperature = getattr(backend, "temperature", None)
+        return temperature == 0 or self.nondeterministic
+
+    def expired(self, timestamp: float) -> bool:
+        return self.ttl is not None and time.time() - timestamp > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        if self.refresh:
+            return None
+        with self.lock:
+            reply = self._get(key)
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return reply
+
+    def _get(self, key: str) -> Optional[str]:
+        if key in self.entries:
+            timestamp, reply = self.entries[key]
+            if not self.expired(timestamp):
+                self.entries.move_to_end(key)
+                return reply
+            del self.entries[key]
+        if self.db is not None:
+            row = self.db.execute("SELECT timestamp, reply FROM responses WHERE key = ?",
+                                  (key,)).fetchone()
+            if row is not None and not self.expired(row[0]):
+                self._put_memory(key, row[0], row[1])
+                return row[1]
+        return None
+
+    def put(self, key: str, reply: str):
+        timestamp = time.time()
+        with self.lock:
+            self._put_memory(key, timestamp, reply)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                                (key, timestamp, reply))
+                if self.maxsize_disk is not None:
+                    self.db.execute("DELETE FROM responses WHERE key NOT IN "
+                                    "(SELECT key FROM responses ORDER BY timestamp DESC LIMIT ?)",
+                                    (self.maxsize_disk,))
+                self.db.commit()
+
+    def _put_memory(self, key: str, timestamp: float, reply: str):
+        self.entries[key] = (timestamp, reply)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries)
+        }
@@ -0,0 +1,99 @@
+import time
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from ms.objects import MObject, MValue, Deferred
+
+
+# Lazy oracle calls.
+#
+# In lazy mode, an oracle call doesn't wait for the reply: it returns a
+# promise, an MValue that is resolved when first used. The pending calls
+# are submitted together, grouped by oracle and packed into batches of
+# batch_size inputs, once there are flush_size of them, once the oldest
+# has waited max_wait seconds (checked at each call), or once one of them
+# is needed. The requests run in the background while the program goes on.
+# The arguments are copied when the call is made, so the prompt is the same
+# as without lazy mode even if they are modified before the flush.
+# Outputs of the wrong type resolve to null, with the error as annotation.
+
+WORKERS = 4
+
+
+class Entry():
+
+    def __init__(self, oracle, args: List[MObject]):
+        self.oracle = oracle
+        self.args = deepcopy(args)
+        self.deadline = oracle.interpreter.deadline
+        self.group = None
+        self.output = None
+
+
+class Group():
+
+    def __init__(self, oracle, entries: List[Entry]):
+        self.oracle = oracle
+        self.entries = entries
+        self.deadline = entries[0].deadline
+        self.batches = None
+        self.future = None
+
+
+class Scheduler():
+
+    def __init__(self, flush_size: int = 64, max_wait: Optional[float] = None, workers: int = WORKERS):
+        self.flush_size = flush_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.pending = []
+        self.oldest = None
+        self.executor = None
+
+    def defer(self, oracle, args: List[MObject]) -> MValue:
+        entry = Entry(oracle, args)
+        if not self.pending:
+            self.oldest = time.monotonic()
+        self.pending.append(entry)
+        promise = MValue(Deferred(lambda value: self.force(entry, value)), None)
+        if len(self.pending) >= self.flush_size or \
+                (self.max_wait is not None and time.monotonic() - self.oldest >= self.max_wait):
+            self.flush()
+        return promise
+
+    # Submits the pending calls.
+    def flush(self):
+        groups = {}
+        for entry in self.pending:
+            groups.setdefault((id(entry.oracle), entry.deadline), []).append(entry)
+        self.pending = []
+        self.oldest = None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        for entries in groups.values():
+            oracle = entries[0].oracle
+            group = Group(oracle, entries)
+            for entry in entries:
+                entry.group = group
+            # The prompts are printed by the interpreter, so not in the background.
+            group.batches, queries = oracle.prepare_batches([entry.args for entry in entries])
+            group.future = self.executor.submit(oracle.interpreter.backend.consult_many, queries,
+                                                None, group.deadline)
+
+    # Waits for the replies of the group, and decodes them.
+    def resolve(self, group: Group):
+        oracle = group.oracle
+        args_list = [entry.args for entry in group.entries]
+        outputs = oracle.resolve(args_list, group.batches, group.future.result(), deadline=group.deadline)
+        for entry, output in zip(group.entries, outputs):
+            if type(output) != MValue or not oracle.interpreter.checktype(output, oracle.outtype):
+                output = MValue(None, "Error: Wrong type of oracle output.")
+            entry.output = output
+
+    def force(self, entry: Entry, value: MValue):
+        if entry.output is None:
+            if entry.group is None:
+                self.flush()
+            self.resolve(entry.group)
+        value.value = entry.output.value
+        value.annotation = entry.output.annotation
@@ -1,9 +1,14 @@
 from typing import Optional, Any, List, Callable
+from array import array
+import sys
+from copy import deepcopy
 import ms.ast as ast
 from ms.printer import Printer
 from ms.parser import Parser
 from ms.types import TypeChecker
 from ms.objects import MObject, MValue, MType, MFunction
+from ms.objects import pack_array, unpack_array, fits_packed
+from ms.objects import ArrayView, writable_array
 from ms.oracle import MOracleFunction
 
 
@@ -37,6 +42,19 @@ class Environment():
         raise KeyError()
 
 
+# Reference counts of an MValue only held by an environment and a local
+# variable, and of its contents. They are measured, since they depend on the
+# Python version.
+
+def owned_refcounts():
+    env = Environment()
+    env.define("x", MValue([], None))
+    value = env.get("x")
+    return [sys.getrefcount(value), sys.getrefcount(value.value)]
+
+OWNED_REFCOUNTS = owned_refcounts()
+
+
 # User-defined functions.
 
 class MUserFunction(MFunction):
@@ -63,6 +81,10 @@ class Interpreter:
         self.printer = Printer()
         self.parser = Parser(interactive=interactive)
         self.checker = TypeChecker(self)
+        # The values of the last iterations of the running for-loops.
+        self.loop_values = []
+        # The deadline (time.monotonic) of the oracle calls, set by withDeadline().
+        self.deadline = None
         if backend is None:
             raise ValueError("The interpreter must be started with an oracle backend.")
         self.backend = backend
@@ -123,6 +145,8 @@ class Interpreter:
         value = None
         exprs = node.program
         for expr in exprs:
+            # Drop the previous value first (see accumulate).
+            value = None
             value = expr.accept(self)
         return value
 
@@ -136,6 +160,12 @@ class Interpreter:
         if type(lvalue) == MValue and type(rvalue) == MValue:
             x = lvalue.value
             y = rvalue.value
+            if type(x) == array and type(y) == array:
+                return x == y
+            if type(x) == array:
+                x = unpack_array(x)
+            if type(y) == array:
+                y = unpack_array(y)
             if x is None and y is None:
                 return True
             elif type(x) == bool and type(y) == bool:
@@ -144,7 +174,7 @@ class Interpreter:
                 return x == y
             elif type(x) == str and type(y) == str: 
                 return x == y
-            elif type(x) == list and type(y) == list:
+            elif type(x) in [list, ArrayView] and type(y) in [list, ArrayView]:
                 if len(x) == len(y):
                     return all(self.compare(subx, suby) for subx, suby in zip(x, y))
                 else:
@@ -190,7 +220,9 @@ class Interpreter:
         # Standard operators.
         lexpr = node.left.accept(self)
         rexpr = node.right.accept(self)
+        return self.operate(operator, lexpr, rexpr)
 
+    def operate(self, operator: ast.Token, lexpr: MObject, rexpr: MObject):
         if operator.ttype == ast.TokenType.EQ:
             return MValue(self.compare(lexpr, rexpr), None)
         if operator.ttype == ast.TokenType.NEQ:
@@ -264,10 +296,18 @@ class Interpreter:
                 return MValue(lvalue <= rvalue, None)
             self.error(operator, "Unexpected operator for string operands.")
         
-        elif type(lvalue) == list and type(rvalue) == list:
+        elif type(lvalue) == array and type(rvalue) == array and lvalue.typecode == rvalue.typecode:
             if operator.ttype == ast.TokenType.PLUS:
                 return MValue(lvalue + rvalue, None)
 
+        elif type(lvalue) in [list, array, ArrayView] and type(rvalue) in [list, array, ArrayView]:
+            if operator.ttype == ast.TokenType.PLUS:
+                if type(lvalue) == array:
+                    lvalue = unpack_array(lvalue)
+                if type(rvalue) == array:
+                    rvalue = unpack_array(rvalue)
+                return MValue([*lvalue, *rvalue], None)
+
         elif type(lvalue) == dict and type(rvalue) == dict:
             if operator.ttype == ast.TokenType.PLUS:
                 return MValue(lvalue | rvalue, None)
@@ -327,10 +367,12 @@ class Interpreter:
         getter = getter_expr.value
         index = index_expr.value
 
-        if type(getter) == list:
+        if type(getter) in [list, array, ArrayView]:
             if type(index) == int:
                 if abs(index) < len(getter):
                     index = index % len(getter)
+                    if type(getter) == array:
+                        return MValue(getter[index], None)
                     return getter[index]
                 self.error(operator, "Array index out of range.")
             self.error(operator, "Array index must be an integer.")
@@ -408,16 +450,26 @@ class Interpreter:
             if type(index) == int:
                 if abs(index) < len(setter):
                     index = index % len(setter)
+                    if type(setter) == array:
+                        if fits_packed(setter, value):
+                            setter[index] = value.value
+                            return value
+                        # Unpack the array in place.
+                        setter = unpack_array(setter)
+                        setter_expr.value = setter
+                    setter = writable_array(setter_expr)
                     setter[index] = value
                     return value
                 self.error(operator, "Array index out of range.")
             self.error(operator, "Attempted to use a non-integer index.")
-        elif type(target) == ast.Array and type(value.value) == list:
+        elif type(target) == ast.Array and type(value.value) in [list, array, ArrayView]:
             res = []
             source = value.value
             if len(target.array) > len(source):
                 self.error(
                     operator, "The assignment expects a larger array on the right-hand-side.")
+            if type(source) == array:
+                source = unpack_array(source[:len(target.array)])
             for n in range(len(target.array)):
                 self.destructure(env, target.array[n], operator, source[n], define)
                 res.append(source[n])
@@ -438,9 +490,56 @@ class Interpreter:
         # Capture environment, because expression on the rhs might change it,
         # e.g. in a function or type instantiation.
         previous = self.env
-        value = node.expr.accept(self)
+        if self.is_accumulation(node):
+            value = self.accumulate(node)
+        else:
+            value = node.expr.accept(self)
         return self.destructure(previous, node.target, node.operator, value)
 
+    def is_accumulation(self, node: ast.Expr):
+        # Matches "x = x + expr".
+        target = node.target
+        expr = node.expr
+        return (type(target) == ast.Terminal
+                and target.token.ttype == ast.TokenType.ID
+                and type(expr) == ast.Binary
+                and expr.operator.ttype == ast.TokenType.PLUS
+                and type(expr.left) == ast.Terminal
+                and expr.left.token.ttype == ast.TokenType.ID
+                and expr.left.token.literal == target.token.literal)
+
+    def accumulate(self, node: ast.Expr):
+        # Evaluates "x = x + expr", appending to the array or object in x
+        # in place rather than copying it, provided nothing else refers to
+        # it: then nobody can observe the difference. Otherwise (and for all
+        # other operand types), this is just the usual binary operation.
+        operator = node.expr.operator
+        lexpr = node.expr.left.accept(self)
+        rexpr = node.expr.right.accept(self)
+        if type(lexpr) != MValue or type(rexpr) != MValue:
+            return self.operate(operator, lexpr, rexpr)
+
+        # The value of a loop's last iteration is often the accumulator.
+        held = sum(1 for value in self.loop_values if value is lexpr)
+        owned = (sys.getrefcount(lexpr) <= OWNED_REFCOUNTS[0] + held
+                 and sys.getrefcount(lexpr.value) <= OWNED_REFCOUNTS[1])
+        lvalue = lexpr.value
+        rvalue = rexpr.value
+        if owned and lvalue is not rvalue:
+            if type(lvalue) == list and type(rvalue) in [list, ArrayView]:
+                lvalue.extend(rvalue)
+            elif type(lvalue) == list and type(rvalue) == array:
+                lvalue.extend(unpack_array(rvalue))
+            elif type(lvalue) == array and type(rvalue) == array and lvalue.typecode == rvalue.typecode:
+                lvalue.extend(rvalue)
+            elif type(lvalue) == dict and type(rvalue) == dict:
+                lvalue.update(rvalue)
+            else:
+                return self.operate(operator, lexpr, rexpr)
+            lexpr.annotation = None
+            return lexpr
+        return self.operate(operator, lexpr, rexpr)
+
     def declaration(self, node: ast.Expr):
         # operator, identifier
         identifier = node.token.literal
@@ -485,6 +584,7 @@ class Interpreter:
         try:
             self.env = env
             for expr in block.exprs:
+                value = None
                 value = expr.accept(self)
         finally:
             # Restore the enclosing environment, potentially 
@@ -513,17 +613,23 @@ class Interpreter:
         iterator = node.iterator.accept(self)
         if isinstance(iterator, MFunction):
             env = Environment(enclosing=self.env)
-            iter = iterator.call(node.operator, [MValue(None, None)])
-            while type(iter) != MValue or iter.value is not None:
-                try:
-                    self.destructure(env, target, node.operator, iter, define=True)
-                    value = self.execute_block(node.expr, env)
-                except ast.Break as e:
-                    value = e.expr
-                    break
-                except ast.Continue as e:
-                    pass
+            # The value of the last iteration is kept in loop_values rather
+            # than in a local, so that accumulate can discount it.
+            self.loop_values.append(None)
+            try:
                 iter = iterator.call(node.operator, [MValue(None, None)])
+                while type(iter) != MValue or iter.value is not None:
+                    try:
+                        self.destructure(env, target, node.operator, iter, define=True)
+                        self.loop_values[-1] = self.execute_block(node.expr, env)
+                    except ast.Break as e:
+                        self.loop_values[-1] = e.expr
+                        break
+                    except ast.Continue as e:
+                        pass
+                    iter = iterator.call(node.operator, [MValue(None, None)])
+            finally:
+                value = self.loop_values.pop()
         else:
             self.error(node.operator,
                        "Can only iterate over an iterator function.")
@@ -593,12 +699,26 @@ class Interpreter:
         values = node.values_expr.accept(self)
         if type(values) != MValue and type(values.value) != list and len(values.value) > 0:
             self.error(operator, "Expected a non-empty array of possible values.")
+        if type(values.value) == array:
+            values = MValue(unpack_array(values.value), values.annotation)
+        # The enum keeps a copy of the values, so that its index, its printed
+        # form and its schema don't change if the array does.
+        values = deepcopy(values)
         typeobj = MType(ip=self, definition=type_expr)
+        index = set()
         for v in values.value:
             if not self.checktype(v, typeobj):
                 vrepr = self.printer.print(v)
                 self.error(operator, f"Found a value ({vrepr}) that is inconsistent with the enum type.")
-        return ast.TypeEnum(operator=operator, type_expr=type_expr, values_expr=values_expr, values=values)
+            # Index the values for constant-time membership tests.
+            # Values that can't be hashed disable the index.
+            key = MValue.hashkey(v)
+            if key is None or index is None:
+                index = None
+            else:
+                index.add(key)
+        return ast.TypeEnum(operator=operator, type_expr=type_expr, values_expr=values_expr,
+                            values=values, index=index)
 
     def type_array(self, node: ast.Expr):
         expr = node.expr.accept(self)
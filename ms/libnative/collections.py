@@ -1,11 +1,18 @@
 from typing import List
-from ms.objects import MNativeFunction, MValue, MObject
+from array import array
+from functools import cmp_to_key
+import heapq
+from ms.objects import MNativeFunction, MValue, MObject, unpack_array, fits_packed
+from ms.objects import ArrayView, slice_array, writable_array
+from ms.objects import MFunction
+from ms.oracle import MOracleFunction
 from ms.interpreter import Interpreter
 import re
 import math
 
 # Arrays/Objects: iter
 # Arrays: slice, push, pop, shift, unshift, map, filter, reduce, find
+# Sorting: sort, binarySearch, heap
 # Objects: delete, keys, values
 # Sets: add, remove, union, intersection
 
@@ -23,6 +30,8 @@ class Iter(MNativeFunction):
             index = self.index
             if index < len(self.array):
                 self.index += 1
+                if type(self.array) == array:
+                    return MValue(self.array[index], None)
                 return self.array[index]
             return MValue(None, None)
 
@@ -55,7 +64,7 @@ class Iter(MNativeFunction):
             return MValue(None, None)
 
         value = arg.value
-        if type(value) == list:
+        if type(value) in [list, array, ArrayView]:
             return Iter.ArrayIterator(self.interpreter, value)
         elif type(value) == dict:
             return Iter.ObjectIterator(self.interpreter, value)
@@ -65,11 +74,11 @@ class Iter(MNativeFunction):
 class Slice(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(array: [Any], s: Int, e: Int) -> [Any]")
-        self.annotation = "Slices an array between two indexes."
+        self.annotation = "Slices an array between two indexes, without copying it."
 
     def func(self, args: List[MObject]):
         arr, s, e = args
-        return MValue(arr.value[s.value: e.value], None)
+        return slice_array(arr, s.value, e.value)
 
 
 class Push(MNativeFunction):
@@ -79,7 +88,12 @@ class Push(MNativeFunction):
 
     def func(self, args: List[MObject]):
         arr, value = args
-        arr.value.append(value)
+        if type(arr.value) == array:
+            if fits_packed(arr.value, value):
+                arr.value.append(value.value)
+                return arr
+            arr.value = unpack_array(arr.value)
+        writable_array(arr).append(value)
         return arr
 
 
@@ -90,6 +104,13 @@ class Pop(MNativeFunction):
 
     def func(self, args: List[MObject]):
         arr = args[0]
+        if type(arr.value) == array:
+            return MValue(arr.value.pop(-1), None)
+        elif type(arr.value) == ArrayView:
+            # Shrinking a view doesn't affect the shared items.
+            value = arr.value[-1]
+            arr.value.stop -= 1
+            return value
         return arr.value.pop(-1)
 
 
@@ -100,7 +121,12 @@ class Shift(MNativeFunction):
 
     def func(self, args: List[MObject]):
         arr, value = args
-        arr.value.insert(0, value)
+        if type(arr.value) == array:
+            if fits_packed(arr.value, value):
+                arr.value.insert(0, value.value)
+                return arr
+            arr.value = unpack_array(arr.value)
+        writable_array(arr).insert(0, value)
         return arr
 
 
@@ -111,6 +137,12 @@ class Unshift(MNativeFunction):
 
     def func(self, args: List[MObject]):
         arr = args[0]
+        if type(arr.value) == array:
+            return MValue(arr.value.pop(0), None)
+        elif type(arr.value) == ArrayView:
+            value = arr.value[0]
+            arr.value.start += 1
+            return value
         return arr.value.pop(0)
 
 
@@ -204,3 +236,190 @@ class Set(MNativeFunction):
         obj, key, value = args
         obj.value[key.value] = value
         return value
+
+
+# Sorting and searching.
+#
+# The optional key function either extracts a key from an item (a function
+# of one argument) or compares two items (a function of two arguments
+# returning a negative, zero or positive number). Keys are converted into
+# Python values and must be numbers, strings, or arrays of them.
+
+def sortkey(fun: MNativeFunction, value: MObject):
+    if type(value) != MValue:
+        fun.error("Sort keys must be numbers, strings or arrays of them.")
+    v = value.value
+    if type(v) in [int, float, str]:
+        return v
+    elif type(v) == array:
+        return tuple(v)
+    elif type(v) in [list, ArrayView]:
+        return tuple(sortkey(fun, item) for item in v)
+    fun.error("Sort keys must be numbers, strings or arrays of them.")
+
+
+# Returns a function mapping an item to a comparable Python key.
+def keyfunc(fun: MNativeFunction, key: MObject):
+    if not isinstance(key, MFunction):
+        return lambda item: sortkey(fun, item)
+    if len(key.params) == 2:
+        def compare(item1, item2):
+            res = key.call(fun._operator, [item1, item2])
+            if type(res) != MValue or type(res.value) not in [int, float]:
+                fun.error("A comparator must return a number.")
+            return res.value
+        return cmp_to_key(compare)
+    return lambda item: sortkey(fun, key.call(fun._operator, [item]))
+
+
+def boxed(items) -> list:
+    if type(items) == array:
+        return unpack_array(items)
+    return items
+
+
+class Sort(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(array: [Any], key: (Any -> Any)?, reverse: Bool?) -> [Any]")
+        self.annotation = "Returns a sorted copy of an array, optionally using a key or comparator function."
+
+    def func(self, args: List[MObject]):
+        arr, key, reverse = args
+        reverse = reverse.value == True
+        items = arr.value
+        try:
+            if type(items) == array and not isinstance(key, MFunction):
+                return MValue(array(items.typecode, sorted(items, reverse=reverse)), None)
+            items = boxed(items)
+            # Decorate-sort-undecorate: the key function is called once per item.
+            extract = keyfunc(self, key)
+            keys = [extract(item) for item in items]
+            order = sorted(range(len(items)), key=keys.__getitem__, reverse=reverse)
+        except TypeError:
+            self.error("Cannot compare the sort keys.")
+        return MValue([items[n] for n in order], None)
+
+
+class BinarySearch(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(array: [Any], value: Any, key: (Any -> Any)?) -> Int")
+        self.annotation = ("Returns the position of a value in a sorted array, or where it would "
+                           "be inserted. With a key function, the value is compared to the items' keys.")
+
+    def func(self, args: List[MObject]):
+        arr, value, key = args
+        items = arr.value
+        extract = keyfunc(self, key)
+        if isinstance(key, MFunction) and len(key.params) == 2:
+            target = extract(value)
+        else:
+            target = sortkey(self, value)
+        low, high = 0, len(items)
+        try:
+            while low < high:
+                middle = (low + high) // 2
+                item = items[middle]
+                if type(items) == array:
+                    item = MValue(item, None)
+                if extract(item) < target:
+                    low = middle + 1
+                else:
+                    high = middle
+        except TypeError:
+            self.error("Cannot compare the search keys.")
+        return MValue(low, None)
+
+
+class Heap(MNativeFunction):
+
+    class HeapPush(MNativeFunction):
+        def __init__(self, ip: Interpreter, heap: 'Heap.State'):
+            super().__init__(ip, "fun(value: Any) -> Int")
+            self.annotation = "Adds a value to the heap and returns the heap's size."
+            self.heap = heap
+
+        def func(self, args: List[MObject]):
+            value = args[0]
+            try:
+                self.heap.push(self, value)
+            except TypeError:
+                self.error("Cannot compare the heap keys.")
+            return MValue(len(self.heap.items), None)
+
+    class HeapPop(MNativeFunction):
+        def __init__(self, ip: Interpreter, heap: 'Heap.State'):
+            super().__init__(ip, "fun() -> Any")
+            self.annotation = "Removes and returns the smallest value, or null if the heap is empty."
+            self.heap = heap
+
+        def func(self, args: List[MObject]):
+            if len(self.heap.items) == 0:
+                return MValue(None, None)
+            return heapq.heappop(self.heap.items)[-1]
+
+    class HeapPeek(MNativeFunction):
+        def __init__(self, ip: Interpreter, heap: 'Heap.State'):
+            super().__init__(ip, "fun() -> Any")
+            self.annotation = "Returns the smallest value, or null if the heap is empty."
+            self.heap = heap
+
+        def func(self, args: List[MObject]):
+            if len(self.heap.items) == 0:
+                return MValue(None, None)
+            return self.heap.items[0][-1]
+
+    class HeapSize(MNativeFunction):
+        def __init__(self, ip: Interpreter, heap: 'Heap.State'):
+            super().__init__(ip, "fun() -> Int")
+            self.annotation = "Returns the number of values in the heap."
+            self.heap = heap
+
+        def func(self, args: List[MObject]):
+            return MValue(len(self.heap.items), None)
+
+    class State():
+        def __init__(self, key: MObject):
+            self.key = key
+            self.items = []
+            self.count = 0
+
+        def push(self, fun: MNativeFunction, value: MObject):
+            # The counter keeps equal keys in insertion order.
+            priority = keyfunc(fun, self.key)(value)
+            heapq.heappush(self.items, (priority, self.count, value))
+            self.count += 1
+
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(key: (Any -> Any)?) -> {}")
+        self.annotation = ("Creates a priority queue with methods push, pop, peek and size, "
+                           "ordered by an optional key or comparator function.")
+
+    def func(self, args: List[MObject]):
+        key = args[0]
+        state = Heap.State(key)
+        ip = self.interpreter
+        return MValue({
+            "push": Heap.HeapPush(ip, state),
+            "pop": Heap.HeapPop(ip, state),
+            "peek": Heap.HeapPeek(ip, state),
+            "size": Heap.HeapSize(ip, state)
+        }, None)
+
+
+class ParallelMap(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(f: Any -> Any, array: [Any], concurrency: Int?) -> [Any]")
+        self.annotation = ("Applies a function to each item of an array. Oracle calls are "
+                           "made concurrently, with at most `concurrency` requests in flight.")
+
+    def func(self, args: List[MObject]):
+        f, arr, concurrency = args
+        items = boxed(arr.value)
+        if concurrency.value is not None and concurrency.value < 1:
+            self.error("The concurrency must be a positive number.")
+        # Partially applied oracles wrap the original's func, so they are
+        # mapped sequentially like any other function.
+        if type(f) == MOracleFunction and "func" not in vars(f) and len(f.params) == 1:
+            f._operator = self._operator
+            return MValue(f.map([[item] for item in items], concurrency.value), None)
+        return MValue([f.call(self._operator, [item]) for item in items], None)
@@ -1,61 +1,143 @@
-from typing import List
-from ms.objects import MNativeFunction, MValue, MObject
+from typing import List, Optional
+from array import array
+from itertools import repeat
+from ms.objects import MNativeFunction, MValue, MObject, ArrayView, pack_array
 from ms.interpreter import Interpreter
 import math
 
 # Basic arithmetic operations: add, subtract, multiply, divide
 # Advanced math functions: sin, cos, tan, log, sqrt, pow
+# Aggregates: sum, mean, dot
 # Constants: PI, E
+#
+# The arithmetic functions accept numbers as well as numeric arrays, and
+# elementwise() applies the other ones to arrays. Arrays are processed in
+# bulk and returned as packed arrays (see ms.objects).
 
 PI = MValue(3.14159265359, "\u03C0")
 E =  MValue(2.7182818284, "Euler's number")
 
+
+# Returns the numbers of a numeric array as a packed array, or None.
+def numbers(arg: MObject) -> Optional[array]:
+    if type(arg) != MValue:
+        return None
+    v = arg.value
+    if type(v) == array:
+        return v
+    if type(v) == list or type(v) == ArrayView:
+        return pack_array([item.value if type(item) == MValue else None for item in v])
+    return None
+
+
+def is_number(arg: MObject) -> bool:
+    return type(arg) == MValue and (type(arg.value) == int or type(arg.value) == float)
+
+
+# Packs the results, falling back to a list if they don't fit.
+def pack_results(typecode: str, results) -> MValue:
+    results = list(results)
+    try:
+        return MValue(array(typecode, results), None)
+    except (TypeError, OverflowError):
+        return MValue([MValue(result, None) for result in results], None)
+
+
+# Applies a binary function elementwise, broadcasting numbers.
+def elementwise(fun: MNativeFunction, op, left: MObject, right: MObject, integral=True) -> MValue:
+    if is_number(left) and is_number(right):
+        return MValue(op(left.value, right.value), None)
+
+    operands = []
+    length = None
+    integers = integral
+    for arg in [left, right]:
+        if is_number(arg):
+            operands.append(repeat(arg.value))
+            integers = integers and type(arg.value) == int
+            continue
+        items = numbers(arg)
+        if items is None:
+            fun.error("Expected a number or a numeric array.")
+        if length is not None and length != len(items):
+            fun.error("The arrays must have the same length.")
+        length = len(items)
+        operands.append(items)
+        integers = integers and items.typecode == "q"
+
+    typecode = "q" if integers else "d"
+    return pack_results(typecode, map(op, *operands))
+
+
+def divide(x, y):
+    if type(x) == int and type(y) == int:
+        return int(x / y)
+    return x / y
+
+
+def log(x):
+    if x <= 0.0:
+        return None
+    return math.log(x)
+
+
+class Pack(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(array: [Num]) -> [Num]")
+        self.annotation = "Packs a numeric array into a compact representation."
+
+    def func(self, args: List[MObject]):
+        arr = args[0]
+        items = numbers(arr)
+        if items is None:
+            return arr
+        return MValue(items, arr.annotation)
+
+
 class Sin(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(value: Num) -> Num")
         self.annotation = "Sine function"
+        self.op = math.sin
 
     def func(self, args: List[MObject]):
-        arg = args[0]
-        return MValue(math.sin(arg.value), None)
+        return MValue(self.op(args[0].value), None)
 
 class Cos(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(value: Num) -> Num")
         self.annotation = "Cosine function"
+        self.op = math.cos
 
     def func(self, args: List[MObject]):
-        arg = args[0]
-        return MValue(math.cos(arg.value), None)
+        return MValue(self.op(args[0].value), None)
 
 class Tan(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(value: Num) -> Num")
         self.annotation = "Tangent function"
+        self.op = math.tan
 
     def func(self, args: List[MObject]):
-        arg = args[0]
-        return MValue(math.tan(arg.value), None)
+        return MValue(self.op(args[0].value), None)
 
 class Log(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(value: Num) -> Num?")
         self.annotation = "Logarithm function"
+        self.op = log
 
     def func(self, args: List[MObject]):
-        arg = args[0]
-        if arg.value <= 0.0:
-            return MValue(None, None)
-        return MValue(math.log(arg.value), None)
+        return MValue(self.op(args[0].value), None)
 
 class Sqrt(MNativeFunction):
     def __init__(self, ip: Interpreter):
         super().__init__(ip, "fun(value: Num) -> Num")
         self.annotation = "Square-root function"
+        self.op = math.sqrt
 
     def func(self, args: List[MObject]):
-        arg = args[0]
-        return MValue(math.sqrt(arg.value), None)
+        return MValue(self.op(args[0].value), None)
 
 class Pow(MNativeFunction):
     def __init__(self, ip: Interpreter):
@@ -65,3 +147,93 @@ class Pow(MNativeFunction):
     def func(self, args: List[MObject]):
         base, exp = args[0], args[1]
         return MValue(math.pow(base.value, exp.value), None)
+
+class Elementwise(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(f: Num -> Num?, values: [Num]) -> [Num?]")
+        self.annotation = "Applies a function to each number of an array."
+
+    def func(self, args: List[MObject]):
+        f, values = args[0], args[1]
+        items = numbers(values)
+        if items is None:
+            self.error("Expected a numeric array.")
+        # The math builtins are applied in bulk.
+        op = getattr(f, "op", None)
+        if op is not None:
+            return pack_results("d", map(op, items))
+        return MValue([f.call(self._operator, [MValue(item, None)]) for item in items], None)
+
+
+class Add(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(left: Any, right: Any) -> Any")
+        self.annotation = "Adds numbers or numeric arrays elementwise."
+
+    def func(self, args: List[MObject]):
+        return elementwise(self, lambda x, y: x + y, args[0], args[1])
+
+class Sub(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(left: Any, right: Any) -> Any")
+        self.annotation = "Subtracts numbers or numeric arrays elementwise."
+
+    def func(self, args: List[MObject]):
+        return elementwise(self, lambda x, y: x - y, args[0], args[1])
+
+class Mul(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(left: Any, right: Any) -> Any")
+        self.annotation = "Multiplies numbers or numeric arrays elementwise."
+
+    def func(self, args: List[MObject]):
+        return elementwise(self, lambda x, y: x * y, args[0], args[1])
+
+class Div(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(left: Any, right: Any) -> Any")
+        self.annotation = "Divides numbers or numeric arrays elementwise."
+
+    def func(self, args: List[MObject]):
+        try:
+            return elementwise(self, divide, args[0], args[1])
+        except ZeroDivisionError:
+            self.error("Division by zero.")
+
+
+class Sum(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(array: [Num]) -> Num")
+        self.annotation = "Sums the values of a numeric array."
+
+    def func(self, args: List[MObject]):
+        items = numbers(args[0])
+        if items is None:
+            self.error("Expected a numeric array.")
+        return MValue(sum(items), None)
+
+class Mean(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(array: [Num]) -> Num?")
+        self.annotation = "Averages the values of a numeric array."
+
+    def func(self, args: List[MObject]):
+        items = numbers(args[0])
+        if items is None:
+            self.error("Expected a numeric array.")
+        if len(items) == 0:
+            return MValue(None, None)
+        return MValue(sum(items) / len(items), None)
+
+class Dot(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(left: [Num], right: [Num]) -> Num")
+        self.annotation = "Dot product of two numeric arrays."
+
+    def func(self, args: List[MObject]):
+        left, right = numbers(args[0]), numbers(args[1])
+        if left is None or right is None:
+            self.error("Expected numeric arrays.")
+        if len(left) != len(right):
+            self.error("The arrays must have the same length.")
+        return MValue(sum(map(lambda x, y: x * y, left, right)), None)
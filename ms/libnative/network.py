@@ -3,6 +3,7 @@ from copy import deepcopy
 import requests
 from ms.objects import MNativeFunction, MValue, MObject
 from ms.interpreter import Interpreter
+import ms.sessions
 import datetime
 
 # Basic HTTP operations: http_get, http_post, http_put, http_delete
@@ -48,7 +49,8 @@ class HTTP(MNativeFunction):
         if method.value is None:
             method = MValue("GET", None)
         try:
-            with requests.request(method.value, url.value, **params) as response:
+            session = ms.sessions.get(url.value)
+            with session.request(method.value, url.value, **params) as response:
                 result = {
                     "statusCode": response.status_code,
                     "headers": dict( response.headers.items() ),
@@ -1,6 +1,7 @@
 from typing import List, Any
 from copy import deepcopy
-from ms.objects import MNativeFunction, MValue, MObject
+from array import array
+from ms.objects import MNativeFunction, MValue, MObject, ArrayView
 from ms.interpreter import Interpreter, Environment
 from ms.types import TypeChecker
 from ms.schema import JSONSchema
@@ -258,7 +259,7 @@ class Size(MNativeFunction):
 
     def func(self, args: List[MObject]):
         arg = args[0]
-        if type(arg) != MValue or type(arg.value) not in [list, dict, str]:
+        if type(arg) != MValue or type(arg.value) not in [list, array, ArrayView, dict, str]:
             return MValue(None, None)
         return MValue(len(arg.value), None)
 
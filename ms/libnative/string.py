@@ -9,6 +9,7 @@ import re
 # Trimming: trim, ltrim, rtrim
 # Splitting and joining: split, join
 # Pattern matching: match, replace
+# Building: stringBuilder
 
 class SubStr(MNativeFunction):
     def __init__(self, ip: Interpreter):
@@ -105,3 +106,41 @@ class Replace(MNativeFunction):
         pattern, replace, string = args
         result = re.sub(pattern.value, replace.value, string.value)
         return MValue(result, None)
+
+
+class StringBuilder(MNativeFunction):
+
+    class BuilderAppend(MNativeFunction):
+        def __init__(self, ip: Interpreter, pieces: List[str]):
+            super().__init__(ip, "fun(string: Str) -> Int")
+            self.annotation = "Appends a string and returns the number of pieces."
+            self.pieces = pieces
+
+        def func(self, args: List[MObject]):
+            self.pieces.append(args[0].value)
+            return MValue(len(self.pieces), None)
+
+    class BuilderBuild(MNativeFunction):
+        def __init__(self, ip: Interpreter, pieces: List[str]):
+            super().__init__(ip, "fun() -> Str")
+            self.annotation = "Returns the concatenation of the appended strings."
+            self.pieces = pieces
+
+        def func(self, args: List[MObject]):
+            string = "".join(self.pieces)
+            # Keep the result as a single piece for further appends.
+            self.pieces[:] = [string]
+            return MValue(string, None)
+
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun() -> {}")
+        self.annotation = ("Creates a string builder with methods append and build, "
+                           "which concatenates the pieces only once.")
+
+    def func(self, args: List[MObject]):
+        pieces = []
+        ip = self.interpreter
+        return MValue({
+            "append": StringBuilder.BuilderAppend(ip, pieces),
+            "build": StringBuilder.BuilderBuild(ip, pieces)
+        }, None)
@@ -7,6 +7,7 @@ from ms.types import TypeChecker
 from ms.schema import JSONSchema
 from ms.bnf import BNFFormatter
 import ms.startup
+import ms.telemetry
 import time
 import datetime
 import random
@@ -44,4 +45,31 @@ class Random(MNativeFunction):
 
     def func(self, args: List[MObject]):
         rand = random.random()
-        return MValue.wrap(rand)
\ No newline at end of file
+        return MValue.wrap(rand)
+
+class WithDeadline(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(seconds: Num, f: Null -> Any) -> Any")
+        self.annotation = ("Calls f, giving up on the oracle calls it makes (including their "
+                           "retries) that don't complete within the seconds.")
+
+    def func(self, args: List[MObject]):
+        seconds, f = args
+        ip = self.interpreter
+        previous = ip.deadline
+        deadline = time.monotonic() + seconds.value
+        ip.deadline = deadline if previous is None else min(previous, deadline)
+        try:
+            return f.call(self._operator, [MValue(None, None)])
+        finally:
+            ip.deadline = previous
+
+class OracleStats(MNativeFunction):
+    def __init__(self, ip: Interpreter):
+        super().__init__(ip, "fun(_: Null) -> [{}]")
+        self.annotation = ("Returns the statistics of the oracles called so far: calls, requests, "
+                           "latencies in seconds, prompt and reply sizes, tokens, retries, cache hits, "
+                           "coalesced requests and failures. The oracles that took the longest come first.")
+
+    def func(self, args: List[MObject]):
+        return MValue.wrap(ms.telemetry.registry.summary())
@@ -3,6 +3,7 @@ from abc import abstractmethod
 import ms.ast as ast
 from copy import deepcopy
 from functools import partialmethod
+from array import array
 
 # Value types
 
@@ -17,6 +18,22 @@ class MObject():
 
 
 
+# Deferred values.
+#
+# In lazy mode (see ms.deferred), oracle calls return an MValue holding a
+# Deferred, which is resolved the first time the value or its annotation
+# is used: resolve(value) sets both. Copies of the MValue share the
+# Deferred, and are resolved to the same output.
+
+class Deferred():
+
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+    def __deepcopy__(self, memo):
+        return self
+
+
 class MValue(MObject):
     def __init__(self, value, annotation=None):
         self._value = value
@@ -42,20 +59,58 @@ class MValue(MObject):
             raise ValueError(f"Cannot unpack a value of type {type(mval)}")
         elif type(mval.value) in [type(None), bool, int, float, str]:
             return mval.value
-        elif type(mval.value) == list:
+        elif type(mval.value) == list or type(mval.value) == ArrayView:
             val = []
             for subval in mval.value:
                 val.append(MValue.unwrap(subval))
             return val
+        elif type(mval.value) == array:
+            return mval.value.tolist()
         elif type(mval.value) == dict:
             val = {}
             for key, subval in mval.value.items():
                 val[key] = MValue.unwrap(subval)
             return val
         raise ValueError(f"Cannot unpack a value of type {type(mval.value)}")
+
+    # Returns a hashable key such that two values compare equal (in the
+    # sense of Interpreter.compare) iff their keys are equal, or None if
+    # the value contains functions or types (which can't be hashed).
+    def hashkey(mval: 'MValue'):
+        if type(mval) != MValue:
+            return None
+        v = mval.value
+        if v is None:
+            return ("null",)
+        elif type(v) in [int, float, str]:
+            return v
+        elif type(v) == bool:
+            # Tag booleans, since in Python True == 1.
+            return ("bool", v)
+        elif type(v) == list or type(v) == ArrayView:
+            keys = []
+            for subval in v:
+                key = MValue.hashkey(subval)
+                if key is None:
+                    return None
+                keys.append(key)
+            return ("list", tuple(keys))
+        elif type(v) == array:
+            return ("list", tuple(v))
+        elif type(v) == dict:
+            items = []
+            for prop, subval in v.items():
+                key = MValue.hashkey(subval)
+                if key is None:
+                    return None
+                items.append((prop, key))
+            return ("dict", frozenset(items))
+        return None
     
     @property
     def value(self):
+        if type(self._value) == Deferred:
+            self._value.resolve(self)
         return self._value
 
     @value.setter
@@ -64,12 +119,107 @@ class MValue(MObject):
 
     @property
     def annotation(self):
+        if type(self._value) == Deferred:
+            self._value.resolve(self)
         return self._annotation
 
     @annotation.setter
     def annotation(self, val):
+        if type(self._value) == Deferred:
+            self._value.resolve(self)
         self._annotation = val
 
+    # Whether the value is a deferred oracle output that wasn't resolved yet.
+    def pending(self) -> bool:
+        return type(self._value) == Deferred
+
+
+
+# Packed arrays.
+#
+# Numeric arrays can also be stored as an array.array of machine integers
+# ("q") or doubles ("d") instead of a list of MValues. They type-check as
+# [Int] and [Num] respectively and otherwise behave like ordinary arrays,
+# except that their items are only boxed into MValues when accessed one by
+# one. Storing a value that doesn't fit unpacks the array into a list.
+
+def pack_array(items: list) -> Optional[array]:
+    # Packs a list of Python numbers, or returns None if it isn't possible.
+    if all(type(item) == int for item in items):
+        try:
+            return array("q", items)
+        except OverflowError:
+            return None
+    if all(type(item) == int or type(item) == float for item in items):
+        return array("d", items)
+    return None
+
+
+def unpack_array(items: array) -> List['MValue']:
+    return [MValue(item, None) for item in items]
+
+
+def fits_packed(items: array, value: MObject) -> bool:
+    if type(value) != MValue or value.annotation is not None:
+        return False
+    if items.typecode == "q":
+        return type(value.value) == int and -2**63 <= value.value < 2**63
+    return type(value.value) == float
+
+
+# Array views.
+#
+# Slicing an array doesn't copy its items. Instead, both the slice and the
+# original array become views onto the same list, and they share it until
+# one of them is modified: the modified side first copies its own items
+# into a new list (see writable_array), so the change is never observed
+# through the other side. The items themselves are shared, as before.
+
+class ArrayView():
+
+    def __init__(self, base: list, start: int = 0, stop: Optional[int] = None):
+        self.base = base
+        self.start = start
+        self.stop = len(base) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.tolist()[index]
+            stop = max(start, stop)
+            return ArrayView(self.base, self.start + start, self.start + stop)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("ArrayView index out of range")
+        return self.base[self.start + index]
+
+    def __iter__(self):
+        return map(self.base.__getitem__, range(self.start, self.stop))
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.tolist(), memo)
+
+    def tolist(self) -> list:
+        return self.base[self.start:self.stop]
+
+
+def slice_array(mval: 'MValue', start: Optional[int], stop: Optional[int]) -> 'MValue':
+    v = mval.value
+    if type(v) == list:
+        v = ArrayView(v)
+        mval.value = v
+    return MValue(v[start:stop], None)
+
+
+def writable_array(mval: 'MValue'):
+    if type(mval.value) == ArrayView:
+        mval.value = mval.value.tolist()
+    return mval.value
 
 
 # Types.
@@ -162,6 +312,12 @@ class MFunction(MObject):
 
         if len(args) < len(self.params):
             return self.partial(args)
+        self.check_input(args)
+        value = self.func(args)
+        self.check_output(value)
+        return value
+
+    def check_input(self, args: List[MObject]):
         for arg, typeobj in zip(args, self.intypes):
             if not self.interpreter.checktype(arg, typeobj):
                 reqtype_str = self.interpreter.printer.print(typeobj)
@@ -170,17 +326,14 @@ class MFunction(MObject):
                 self.error(f"Wrong type of function argument: "
                            f"Expected {reqtype_str} but got value {val_str} of {valtype_str}.")
 
-        value = self.func(args)
-
+    def check_output(self, value: MObject):
         if not self.interpreter.checktype(value, self.outtype):
-            reqtype_str = self.interpreter.printer.print(typeobj)
-            val_str = self.interpreter.printer.print(arg)
-            valtype_str = self.interpreter.printer.print(self.interpreter.typeof(arg))
+            reqtype_str = self.interpreter.printer.print(self.outtype)
+            val_str = self.interpreter.printer.print(value)
+            valtype_str = self.interpreter.printer.print(self.interpreter.typeof(value))
             self.error(f"Wrong type of function output: "
                        f"Expected {reqtype_str} but got value {val_str} of {valtype_str}.")
 
-        return value
-
     def partial(self, args: List[MObject]) -> MObject:
         n_args = len(args)
         funcobj = deepcopy(self)
@@ -1,13 +1,47 @@
 import requests
 import os
 import json
+import hashlib
+from array import array
 from typing import List, Any
-from ms.schema import JSONSchema
+from ms.schema import JSONSchema, compact_schema
 from ms.bnf import BNFFormatter
-from ms.objects import MType, MValue, MObject, MFunction
+from ms.retrieval import BM25Index
+from ms.validator import Validator
+import ms.budget
+import ms.telemetry
+from ms.objects import MType, MValue, MObject, MFunction, ArrayView, unpack_array
 import ms.ast as ast
 
 
+# Example selection: if set, the prompts only include the `EXAMPLES_TOP_K`
+# examples most relevant to the input, and only as many as fit in
+# `PROMPT_BUDGET` (estimated) tokens.
+EXAMPLES_TOP_K = None
+PROMPT_BUDGET = None
+
+# Lazy mode: if set, oracle calls are deferred to the scheduler (see
+# ms.deferred).
+SCHEDULER = None
+
+# Compact prompts: minified schemas, values on a single line, and the task
+# and the descriptions stated only once.
+COMPACT = False
+
+
+def configure(top_k: int = None, budget: int = None, scheduler: 'Scheduler' = None,  # type: ignore
+              compact: bool = False):
+    global EXAMPLES_TOP_K, PROMPT_BUDGET, SCHEDULER, COMPACT
+    EXAMPLES_TOP_K = top_k
+    PROMPT_BUDGET = budget
+    SCHEDULER = scheduler
+    COMPACT = compact
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
 HEADER = """
 You are a helpful assistant, and your task is to provide answers
 respecting the formatting instructions.
@@ -48,6 +82,38 @@ OUTPUT:
 
 """
 
+BATCH_QUERY = """
+TASK:
+
+{task}
+
+Answer each of the following {count} inputs separately, in the same order, with an array of {count} outputs.
+
+INPUTS:
+
+{inputs}
+
+OUTPUTS:
+
+"""
+
+COMPACT_HEADER = """You are a helpful assistant, and your task is to provide answers respecting the formatting instructions.
+INPUT JSON SCHEMA: {input_schema}
+OUTPUT JSON SCHEMA: {output_schema}
+TASK: {task}
+"""
+
+COMPACT_EXAMPLE = """INPUT: {input}
+OUTPUT: {output}
+"""
+
+COMPACT_QUERY = """INPUT: {input}
+OUTPUT: """
+
+COMPACT_BATCH_QUERY = """Answer each of the following {count} inputs separately, in the same order, with an array of {count} outputs.
+INPUTS: {inputs}
+OUTPUTS: """
+
 
 class MOracleFunction(MFunction):
 
@@ -71,40 +137,72 @@ class MOracleFunction(MFunction):
             out_type = self.outtype.definition
             self.output_schema = jsonschema.print_schema(MType(ip, out_type))
             self.output_grammar = bnf.format(MType(ip, out_type))
+            self.batch_schema = jsonschema.print_schema(MType(ip, ast.TypeArray(expr=out_type)))
+            self.batch_grammar = bnf.format(MType(ip, ast.TypeArray(expr=out_type)))
         except Exception as e:
             print("Exception:" + str(e))
+        self.output_tokens = ms.budget.output_tokens(MType(ip, self.outtype.definition))
         self.examples = self.validate_examples(examples)
+        self.prefix = None
+        self.prefix_key = None
+        self.prefix_bank = None
+        self.affinity = None
+        self.header = None
+        self.rendered = []
+        self.inputs = []
+        self.index = None
 
         # Add null return.
         if type(self.outtype.definition) != ast.TypeUnary:
             self._outtype._definition = ast.TypeUnary(expr=self.outtype.definition)
 
+        # Replies are decoded and checked against the output type at once.
+        self.validator = Validator(ip, self.outtype)
+        self.batch_validator = Validator(ip, MType(ip, ast.TypeArray(expr=self.outtype.definition)))
+
+        self.stats = ms.telemetry.registry.register(ip.print(self), self.definition)
+
     def prepare_input(self, args: List[MObject]):
         data = {}
         for param, arg in zip(self.params, args):
             data[param.literal] = arg
-        return self.interpreter.print(MValue(data, None))
+        return self.render(MValue(data, None))
+
+    # Values are rendered as compact JSON in compact prompts, and by the
+    # printer otherwise (or if they aren't JSON).
+    def render(self, value: MObject):
+        if COMPACT:
+            try:
+                return json.dumps(MValue.unwrap(value), ensure_ascii=False, separators=(",", ":"))
+            except (ValueError, TypeError):
+                pass
+        return self.interpreter.print(value)
 
     def prepare_task(self):
         if self.definition.types.annotation:
             return self.definition.types.annotation
         return "Determine the output from the input."
 
+    # The limit on the tokens of a reply, None if unbounded. The annotation
+    # of the oracle can override the one derived from the output type.
+    def prepare_max_tokens(self):
+        override = ms.budget.from_annotation(self.definition.types.annotation)
+        return override if override is not None else self.output_tokens
+
     def prepare_examples(self):
-        task = self.prepare_task()
-        body = ""
-        for example in self.examples.value:
-            input_example = self.prepare_input(example.value[:-1])
-            output_example = self.interpreter.print(example.value[-1])
-            body += EXAMPLE.format(task=task, input=input_example, output=output_example)
-        return body
+        self.prepare_prefix()
+        return "".join(self.rendered)
 
     def validate_examples(self, examples: MValue):
-        if type(examples) != MValue or type(examples.value) != list:
+        if type(examples) != MValue or type(examples.value) not in [list, ArrayView]:
             self.error("The examples must be of type [[Any]].")
 
         length = len(self.params) + 1
         for example in examples.value:
+            if type(example.value) == array:
+                example.value = unpack_array(example.value)
+            elif type(example.value) == ArrayView:
+                example.value = example.value.tolist()
             if type(example.value) != list or len(example.value) != length:
                 self.error(f"Each example must be an array of length {length}, "
                            f"but found {self.interpreter.print(example)}.")
@@ -121,22 +219,183 @@ class MOracleFunction(MFunction):
                 self.error(f"Expected output value of type '{typestr}' but found: {valuestr}.")
         return examples
 
-    def func(self, args: List[MObject]):
+    def prepare_prefix(self):
+        # The header and the examples don't depend on the arguments, so they
+        # are built once, and again only if the annotation or the examples
+        # change. Examples added to the array (or an array that was copied on
+        # write) are told by its identity and length, without walking it.
+        bank = self.examples.value
+        key = (self.prepare_task(), COMPACT, len(bank))
+        if key != self.prefix_key or bank is not self.prefix_bank:
+            task = key[0]
+            if COMPACT:
+                seen = {task.strip()}
+                self.header = COMPACT_HEADER.format(input_schema=compact_schema(self.input_schema, seen),
+                                                    output_schema=compact_schema(self.output_schema, seen),
+                                                    task=task)
+            else:
+                self.header = HEADER.format(input_schema=self.input_schema, output_schema=self.output_schema)
+            self.rendered = []
+            inputs = []
+            for example in self.examples.value:
+                input_example = self.prepare_input(example.value[:-1])
+                output_example = self.render(example.value[-1])
+                template = COMPACT_EXAMPLE if COMPACT else EXAMPLE
+                self.rendered.append(template.format(task=task, input=input_example, output=output_example))
+                inputs.append(input_example)
+            self.prefix = self.header + "".join(self.rendered)
+            self.prefix_key = key
+            self.prefix_bank = bank
+            self.inputs = inputs
+            self.index = None
+            # Oracles sharing a prefix can share a server's prompt cache.
+            self.affinity = hashlib.sha1(self.prefix.encode("utf-8")).hexdigest()[:16]
+        return self.prefix
+
+    # Returns the header followed by the examples most relevant to the input
+    # text, in their original order, or the whole prefix if there's no
+    # selection. The budget includes the query.
+    def prepare_context(self, query: str, text: str):
+        prefix = self.prepare_prefix()
+        if EXAMPLES_TOP_K is None and PROMPT_BUDGET is None:
+            return prefix
+        if self.index is None:
+            self.index = BM25Index(self.inputs)
+        ranked = self.index.rank(text)
+        if EXAMPLES_TOP_K is not None:
+            ranked = ranked[:EXAMPLES_TOP_K]
+        chosen = []
+        if PROMPT_BUDGET is None:
+            chosen = ranked
+        else:
+            available = PROMPT_BUDGET - estimate_tokens(self.header) - estimate_tokens(query)
+            for n in ranked:
+                cost = estimate_tokens(self.rendered[n])
+                if cost <= available:
+                    chosen.append(n)
+                    available -= cost
+        return self.header + "".join(self.rendered[n] for n in sorted(chosen))
+
+    def prepare_prompt(self, args: List[MObject]):
         task = self.prepare_task()
-        input_schema = self.input_schema
-        output_schema = self.output_schema
         input_example = self.prepare_input(args)
+        query = (COMPACT_QUERY if COMPACT else QUERY).format(task=task, input=input_example)
+        return self.prepare_context(query, input_example) + query
 
-        prompt = HEADER.format(input_schema=input_schema, output_schema=output_schema)
-        prompt += self.prepare_examples()
-        prompt += QUERY.format(task=task, input=input_example)
+    def prepare_batch_prompt(self, args_list: List[List[MObject]]):
+        task = self.prepare_task()
+        if COMPACT:
+            inputs = ",".join(self.prepare_input(args) for args in args_list)
+            query = COMPACT_BATCH_QUERY.format(task=task, count=len(args_list), inputs=f"[{inputs}]")
+        else:
+            inputs = ",\n".join(self.prepare_input(args) for args in args_list)
+            query = BATCH_QUERY.format(task=task, count=len(args_list), inputs=f"[\n{inputs}\n]")
+        return self.prepare_context(query, inputs) + query
+
+    def prepare_query(self, args_list: List[List[MObject]]):
+        if len(args_list) == 1:
+            return (self.prepare_prompt(args_list[0]), self.output_grammar, self.output_schema,
+                    self.affinity, self.prepare_max_tokens(), self.stats)
+        tokens = ms.budget.batch_tokens(self.prepare_max_tokens(), len(args_list),
+                                        self.interpreter.backend.max_tokens)
+        return (self.prepare_batch_prompt(args_list), self.batch_grammar, self.batch_schema,
+                self.affinity, tokens, self.stats)
+
+    # Replies that aren't JSON of the output type are evaluated as code.
+    def decode(self, code: str):
+        value = self.validator.decode(code)
+        if value is not None:
+            return value
+        try:
+            return self.interpreter.eval(code)
+        except ValueError as e:
+            return MValue(None, str(e))
+
+    def func(self, args: List[MObject]):
+        if SCHEDULER is not None:
+            return SCHEDULER.defer(self, args)
+        prompt = self.prepare_prompt(args)
+        self.stats.name = self.definition.types.annotation
 
         try:
-            code = self.interpreter.backend.consult(prompt, self.output_grammar)
-            output = self.interpreter.eval(code)
+            code = self.interpreter.backend.consult(prompt, self.output_grammar, self.output_schema,
+                                                    deadline=self.interpreter.deadline, affinity=self.affinity,
+                                                    max_tokens=self.prepare_max_tokens(), stats=self.stats)
         except ValueError as e:
+            self.stats.record_calls(1, 1)
             return MValue(None, str(e))
-        return output
+        value = self.decode(code)
+        self.stats.record_calls(1, int(type(value) == MValue and value.value is None))
+        return value
+
+    # Splits the reply to a batch into the outputs of its items. Items whose
+    # output is missing or has the wrong type are None.
+    def decode_batch(self, count: int, code):
+        if isinstance(code, ValueError):
+            return [MValue(None, str(code))] if count == 1 else [None] * count
+        if count == 1:
+            return [self.decode(code)]
+        outputs = self.batch_validator.decode(code)
+        if outputs is not None and len(outputs.value) == count:
+            return outputs.value
+        try:
+            outputs = self.interpreter.eval(code)
+        except ValueError:
+            return [None] * count
+        if type(outputs) != MValue or type(outputs.value) not in [list, array] or len(outputs.value) != count:
+            return [None] * count
+        if type(outputs.value) == array:
+            outputs.value = unpack_array(outputs.value)
+        return [output if self.validator.check(output) else None
+                for output in outputs.value]
+
+    # Calls the oracle on each argument list, packing up to batch_size inputs
+    # into a request. Only the backend requests run concurrently: the
+    # interpreter itself is single-threaded.
+    def map(self, args_list: List[List[MObject]], concurrency: int = None, deadline: float = None):
+        for args in args_list:
+            self.check_input(args)
+        if deadline is None:
+            deadline = self.interpreter.deadline
+        batches, queries = self.prepare_batches(args_list)
+        codes = self.interpreter.backend.consult_many(queries, concurrency, deadline)
+        results = self.resolve(args_list, batches, codes, concurrency, deadline)
+        for value in results:
+            self.check_output(value)
+        return results
+
+    # Splits the argument lists into batches of up to batch_size inputs, and
+    # returns the batches and their queries.
+    def prepare_batches(self, args_list: List[List[MObject]]):
+        size = max(self.interpreter.backend.batch_size, 1)
+        batches = [args_list[n:n+size] for n in range(0, len(args_list), size)]
+        return batches, [self.prepare_query(batch) for batch in batches]
+
+    # Decodes the replies to the batches into the outputs of the argument lists.
+    def resolve(self, args_list: List[List[MObject]], batches: list, codes: list,
+                concurrency: int = None, deadline: float = None):
+        backend = self.interpreter.backend
+        results = []
+        for batch, code in zip(batches, codes):
+            results += self.decode_batch(len(batch), code)
+
+        # Items that failed in a batch are retried with single calls.
+        failed = [n for n, value in enumerate(results) if value is None]
+        codes = backend.consult_many([self.prepare_query([args_list[n]]) for n in failed], concurrency, deadline)
+        for n, code in zip(failed, codes):
+            results[n] = self.decode_batch(1, code)[0]
+
+        self.stats.name = self.definition.types.annotation
+        self.stats.record_calls(len(results), sum(1 for value in results
+                                                  if type(value) == MValue and value.value is None))
+        return results
+
+    # Deferred outputs are checked when resolved.
+    def check_output(self, value: MObject):
+        if type(value) == MValue and value.pending():
+            return
+        if not self.validator.check(value):
+            super().check_output(value)
 
     def __repr__(self):
         return "<oracle>"
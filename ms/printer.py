@@ -1,7 +1,8 @@
 import re
 from typing import List, Dict
+from array import array
 from ms.ast import TokenType, Expr, TypeArray
-from ms.objects import MObject, MValue, MType, MFunction
+from ms.objects import MObject, MValue, MType, MFunction, ArrayView, unpack_array
 
 TABLEN = 4
 MAXDEPTH = 4
@@ -273,7 +274,9 @@ class Printer():
                 txt = str(v)
             elif type(v) == bool:
                 txt = "true" if v else "false"
-            elif type(v) == list:
+            elif type(v) in [list, array, ArrayView]:
+                if type(v) == array:
+                    v = unpack_array(v)
                 if self.is_max_depth():
                     return "[...]"
                 items = []
@@ -0,0 +1,70 @@
+import sys
+import ms.oracle
+import ms.backend
+from ms.objects import MValue
+from ms.oracle import MOracleFunction, estimate_tokens
+from ms.startup import interpreter
+from ms.libnative.auxiliary import flattened_env
+
+
+# Token counts of the oracle prompts, with and without compact prompts.
+#
+#   python -m ms.prompttokens [program.ms]
+#
+# Lists, for each oracle defined by the program (the language library by
+# default), the tokens of the prompt of a call on its first example's
+# input. Tokens are counted with tiktoken if it is installed, and estimated
+# otherwise.
+
+LIBRARY = "ms/lib/lang.ms"
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if ENCODING is not None:
+        return len(ENCODING.encode(text))
+    return estimate_tokens(text)
+
+
+def oracles(path: str) -> dict:
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    with open(path) as fh:
+        ip.eval(fh.read(), path)
+    return {name: value for name, value in flattened_env(ip.env).items()
+            if type(value) == MOracleFunction}
+
+
+def prompt(oracle: MOracleFunction, compact: bool) -> str:
+    ms.oracle.COMPACT = compact
+    if oracle.examples.value:
+        args = oracle.examples.value[0].value[:-1]
+    else:
+        args = [MValue(param.literal, None) for param in oracle.params]
+    return oracle.prepare_prompt(args)
+
+
+def compare(path: str) -> list:
+    rows = []
+    for name, oracle in oracles(path).items():
+        rows.append((name, count_tokens(prompt(oracle, False)), count_tokens(prompt(oracle, True))))
+    ms.oracle.COMPACT = False
+    return rows
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else LIBRARY
+    rows = compare(path)
+    rows.append(("total", sum(row[1] for row in rows), sum(row[2] for row in rows)))
+    print(f"{'oracle':<16}{'default':>10}{'compact':>10}{'saved':>8}")
+    for name, default, compact in rows:
+        saved = 1 - compact / default if default else 0
+        print(f"{name:<16}{default:>10}{compact:>10}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
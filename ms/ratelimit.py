@@ -0,0 +1,144 @@
+import re
+import time
+import threading
+from typing import Optional
+
+
+# Client-side rate limiting.
+#
+# A RateLimiter keeps a token bucket for the requests and another one for
+# the (estimated) tokens sent to a backend per minute, and synchronizes them
+# with the rate-limit headers of the replies when the API provides them.
+# A ConcurrencyController adapts the number of requests in flight to the
+# observed latency and errors (additive increase, multiplicative decrease).
+
+class TokenBucket():
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until the amount is available.
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+# Parses durations such as "20ms", "1.5s" or "6m0s".
+def parse_duration(text: str) -> Optional[float]:
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", text)
+    if not parts:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+    return sum(float(value) * units[unit] for value, unit in parts)
+
+
+class RateLimiter():
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    # Blocks until a request with the given number of tokens may be sent.
+    def acquire(self, tokens: int, deadline: Optional[float] = None):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = max(0.0, self.blocked_until - now)
+                for bucket, amount in [(self.requests, 1), (self.tokens, tokens)]:
+                    if bucket is not None:
+                        bucket.refill(now)
+                        delay = max(delay, bucket.wait_time(amount))
+                if delay == 0.0:
+                    for bucket, amount in [(self.requests, 1), (self.tokens, tokens)]:
+                        if bucket is not None:
+                            bucket.level -= amount
+                    return
+            if deadline is not None and now + delay >= deadline:
+                raise ValueError("Error: Rate limit exceeds the deadline")
+            self.waited += delay
+            time.sleep(delay)
+
+    # Corrects the token estimate once the actual usage is known.
+    def settle(self, estimate: int, used: int):
+        with self.lock:
+            if self.tokens is not None:
+                self.tokens.level -= used - estimate
+
+    def update(self, headers):
+        with self.lock:
+            now = time.monotonic()
+            for bucket, name in [(self.requests, "requests"), (self.tokens, "tokens")]:
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}", ""))
+                if remaining is None or not remaining.isdigit():
+                    continue
+                if bucket is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, int(remaining))
+                if int(remaining) == 0 and reset is not None:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+            retry_after = headers.get("retry-after")
+            if retry_after is not None and parse_duration(retry_after) is not None:
+                self.blocked_until = max(self.blocked_until, now + parse_duration(retry_after))
+
+
+class ConcurrencyController():
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 latency_target: Optional[float] = None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        # Without a target, latencies above twice the fastest one observed
+        # are taken as a sign of congestion.
+        self.latency_target = latency_target
+        self.fastest = None
+        self.decreased = 0.0
+        self.inflight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, deadline: Optional[float] = None):
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    raise ValueError("Error: Deadline exceeded waiting for a request slot")
+                self.condition.wait(timeout)
+            self.inflight += 1
+
+    # The latency is None if no request was sent.
+    def release(self, latency: Optional[float], congested: bool = False):
+        with self.condition:
+            self.inflight -= 1
+            self.condition.notify_all()
+            if latency is None:
+                return
+            now = time.monotonic()
+            if not congested:
+                if self.fastest is None or latency < self.fastest:
+                    self.fastest = latency
+                congested = latency > (self.latency_target or 2 * self.fastest)
+            if congested:
+                # Requests sent before the last decrease don't reflect it.
+                if now - latency >= self.decreased:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreased = now
+            else:
+                # Grows by about one request per round of `limit` requests.
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
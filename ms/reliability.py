@@ -0,0 +1,103 @@
+import time
+import random
+import threading
+from collections import deque
+from typing import Optional
+
+
+# Handling of slow and failing backends.
+#
+# Failures that may go away on their own (connection errors, timeouts,
+# rate limiting and server errors) are raised as TransientError, and can be
+# retried after an exponential backoff. A circuit breaker stops sending
+# requests to a backend that keeps failing, and hedging sends a duplicate
+# request when a reply takes longer than most.
+
+class TransientError(ValueError):
+    pass
+
+
+class RetryPolicy():
+
+    def __init__(self, retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    # Yields the delays before each retry, using "full jitter": a random
+    # delay up to the exponential backoff, so that clients don't retry in sync.
+    def delays(self):
+        for n in range(self.retries):
+            yield random.uniform(0, min(self.max_delay, self.base_delay * 2 ** n))
+
+
+class CircuitBreaker():
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    # Closed: requests are allowed. Open: requests fail immediately until the
+    # cooldown has passed. Then a single probe request is let through, which
+    # closes the breaker if it succeeds. A probe that ends otherwise (e.g.
+    # with a non-transient error) must be released, so that another one can
+    # be sent.
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.probing or time.monotonic() - self.opened < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened = time.monotonic()
+            self.probing = False
+
+    # Ends a probe without telling whether the backend works.
+    def release(self):
+        with self.lock:
+            self.probing = False
+
+    def state(self) -> str:
+        with self.lock:
+            if self.opened is None:
+                return "closed"
+            return "half-open" if self.probing else "open"
+
+
+class Hedging():
+
+    def __init__(self, percentile: float = 0.95, window: int = 100, min_samples: int = 20):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.hedged = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+
+    # The delay after which a duplicate request is sent, or None while there
+    # are too few latencies to tell.
+    def threshold(self) -> Optional[float]:
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[min(int(self.percentile * len(latencies)), len(latencies) - 1)]
@@ -0,0 +1,77 @@
+import json
+import random
+import threading
+from typing import Optional, Callable
+
+
+# Recording and replaying of oracle replies.
+#
+# A Recorder appends each (prompt, grammar) -> reply exchange of a backend
+# to a JSON Lines file. The Replay backend (see ms.backend) serves the
+# replies from such a file, without network access, optionally waiting for
+# a simulated latency, so that oracle-heavy programs can be benchmarked
+# and tested reproducibly.
+
+class Recorder():
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fh = open(path, "a", encoding="utf-8")
+
+    def record(self, prompt: str, output_grammar: str, reply: str, latency: float):
+        line = json.dumps({"prompt": prompt, "grammar": output_grammar,
+                           "reply": reply, "latency": latency})
+        with self.lock:
+            self.fh.write(line + "\n")
+            self.fh.flush()
+
+    def close(self):
+        with self.lock:
+            self.fh.close()
+
+
+# Replies are looked up regardless of trailing whitespace.
+def key(prompt: str, output_grammar: str) -> tuple:
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    return ("\n".join(lines), output_grammar)
+
+
+def load(path: str) -> list:
+    records = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+# Parses a latency distribution, returning a function of the recorded
+# latency that gives the latency to simulate:
+#   "none"              no latency,
+#   "recorded"          the recorded latency,
+#   "fixed:S"           S seconds,
+#   "uniform:A:B"       between A and B seconds,
+#   "lognormal:M:S"     log-normally distributed with median M and shape S.
+def latency_model(spec: str, seed: Optional[int] = None) -> Callable[[float], float]:
+    rng = random.Random(seed)
+    name, *params = spec.split(":")
+    try:
+        params = [float(param) for param in params]
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec}")
+    arities = {"none": 0, "recorded": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+    if name not in arities:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    if len(params) != arities[name]:
+        raise ValueError(f"The latency distribution '{name}' takes {arities[name]} parameters.")
+    if name == "none":
+        return lambda recorded: 0.0
+    elif name == "recorded":
+        return lambda recorded: recorded
+    elif name == "fixed":
+        return lambda recorded: params[0]
+    elif name == "uniform":
+        return lambda recorded: rng.uniform(params[0], params[1])
+    median, shape = params
+    return lambda recorded: median * rng.lognormvariate(0.0, shape)
@@ -0,0 +1,48 @@
+import re
+import math
+from collections import Counter
+from typing import List
+
+
+# A small BM25 index, used by the oracles to pick the examples that are
+# most relevant to the input.
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class BM25Index():
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self.lengths = []
+        self.postings = {}
+        for n, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings.setdefault(term, []).append((n, count))
+        self.average = sum(self.lengths) / self.size if self.size > 0 else 0.0
+
+    def idf(self, term: str) -> float:
+        frequency = len(self.postings.get(term, []))
+        return math.log(1.0 + (self.size - frequency + 0.5) / (frequency + 0.5))
+
+    def scores(self, query: str) -> List[float]:
+        scores = [0.0] * self.size
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            idf = self.idf(term)
+            for n, count in self.postings[term]:
+                norm = 1.0 - self.b + self.b * self.lengths[n] / (self.average or 1.0)
+                scores[n] += idf * count * (self.k1 + 1.0) / (count + self.k1 * norm)
+        return scores
+
+    # The documents from the most to the least relevant, in their original
+    # order if equally relevant.
+    def rank(self, query: str) -> List[int]:
+        scores = self.scores(query)
+        return sorted(range(self.size), key=lambda n: -scores[n])
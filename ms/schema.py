@@ -1,7 +1,10 @@
 import ms.ast as ast
 from ms.objects import MType
+from ms.typecache import cache
 import json
 import re
+from functools import lru_cache
+from typing import Optional
 
 TABLEN = 4
 
@@ -33,14 +36,14 @@ class JSONSchema():
         if identifier in visited:
             raise ValueError(f"Recursive types such as '{name}' are not allowed.")        
         visited.append(identifier)
-        return node
+        return node, res.environment
 
     # TODO: Solve for references.
     def type_terminal(self, node, env=None, visited=[]):
         obj = {}
         if node.token.ttype == ast.TokenType.ID:
-            new_node = self._resolve_ref(node.token.literal, env, visited)
-            return new_node.accept(self, env=env, visited=visited)
+            new_node, new_env = self._resolve_ref(node.token.literal, env, visited)
+            return new_node.accept(self, env=new_env, visited=visited)
         elif node.token.ttype == ast.TokenType.TYPE:
             obj["type"] = None
             if node.token.literal == "Int":
@@ -69,8 +72,10 @@ class JSONSchema():
         obj = node.expr.accept(self, env=env, visited=visited)
         if type(obj["type"]) == str:
             obj["type"] = [obj["type"], "null"] 
-        if type(obj["type"]) == list and "null" not in obj:
-            obj["type"] = obj["type"].append("null")
+        if type(obj["type"]) == list and "null" not in obj["type"]:
+            obj["type"].append("null")
+        if "enum" in obj and None not in obj["enum"]:
+            obj["enum"].append(None)
         return obj
 
     # TODO
@@ -108,6 +113,125 @@ class JSONSchema():
     def print_schema(self, value):
         if type(value) != MType:
             return None
+        return cache.get("schema", value, self._print_schema)
+
+    def _print_schema(self, value):
         visited = [id(value.definition)]
         schema = value.definition.accept(self, env=value.environment, visited=visited)
         return json.dumps(schema, indent=4)
+
+
+# Structured outputs.
+#
+# OpenAI's structured outputs in strict mode accept a subset of JSON schema:
+# the root must be an object, every property must be required and objects
+# must be closed. The output is therefore wrapped as {"output": ...}, and
+# optional properties become nullable instead. Oracles can always answer
+# null, so the output is nullable too. Types such as Any, which have no
+# strict equivalent, give None.
+
+OUTPUT_KEY = "output"
+
+
+@lru_cache(maxsize=1024)
+def _load(schema: str) -> dict:
+    return json.loads(schema)
+
+
+def _nullable(obj: dict) -> dict:
+    if type(obj["type"]) == str:
+        obj["type"] = [obj["type"], "null"]
+    elif "null" not in obj["type"]:
+        obj["type"].append("null")
+    if "enum" in obj and None not in obj["enum"]:
+        obj["enum"].append(None)
+    return obj
+
+
+def _strict(obj: dict) -> Optional[dict]:
+    kinds = obj.get("type")
+    if kinds is None:
+        return None
+    kinds = [kinds] if type(kinds) == str else kinds
+    # Objects and arrays need a schema for their contents.
+    if ("object" in kinds and "properties" not in obj) or ("array" in kinds and "items" not in obj):
+        return None
+    obj = dict(obj)
+    if "items" in obj:
+        obj["items"] = _strict(obj["items"])
+        if obj["items"] is None:
+            return None
+    if "properties" in obj:
+        properties = {}
+        for key, value in obj["properties"].items():
+            value = _strict(value)
+            if value is None:
+                return None
+            properties[key] = value if key in obj["required"] else _nullable(value)
+        obj["properties"] = properties
+        obj["required"] = list(properties)
+        obj["additionalProperties"] = False
+    if "enum" in obj:
+        obj["enum"] = list(obj["enum"])
+    if type(obj["type"]) == list:
+        obj["type"] = list(obj["type"])
+    return obj
+
+
+# Returns the strict schema of the wrapped output for a printed schema.
+@lru_cache(maxsize=1024)
+def strict_schema(schema: str) -> Optional[dict]:
+    output = _strict(_load(schema))
+    if output is None:
+        return None
+    return {
+        "type": "object",
+        "properties": {OUTPUT_KEY: _nullable(output)},
+        "required": [OUTPUT_KEY],
+        "additionalProperties": False
+    }
+
+
+def _prune(value, obj: dict):
+    if type(value) == dict and "properties" in obj:
+        return {key: _prune(item, obj["properties"][key]) for key, item in value.items()
+                if key in obj["properties"] and (item is not None or key in obj["required"])}
+    if type(value) == list and "items" in obj:
+        return [_prune(item, obj["items"]) for item in value]
+    return value
+
+
+# Returns the output of a structured reply as JSON, without the optional
+# properties that are null.
+def unwrap_output(schema: str, reply: str) -> str:
+    value = json.loads(reply)[OUTPUT_KEY]
+    return json.dumps(_prune(value, _load(schema)))
+
+
+# Compact prompts.
+#
+# Prompts carry the schemas minified, and a description that was already
+# given (the task, or a named type used more than once) is only stated the
+# first time.
+
+def _undescribe(obj: dict, seen: set) -> dict:
+    compact = {}
+    for key, value in obj.items():
+        if key == "description":
+            if value.strip() in seen:
+                continue
+            seen.add(value.strip())
+            compact[key] = value
+        elif key == "items":
+            compact[key] = _undescribe(value, seen)
+        elif key == "properties":
+            compact[key] = {prop: _undescribe(item, seen) for prop, item in value.items()}
+        else:
+            compact[key] = value
+    return compact
+
+
+# Returns a printed schema minified, without the descriptions in `seen`,
+# and adds its descriptions to `seen`.
+def compact_schema(schema: str, seen: set) -> str:
+    return json.dumps(_undescribe(_load(schema), seen), ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,64 @@
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Pooled HTTP sessions.
+#
+# Sessions keep connections alive between requests, avoiding a new TCP (and
+# TLS) handshake per oracle call. There is one session per host, shared by
+# all the interpreters and backends of the process. The connection-reuse
+# benchmark is benchmarks/sessions.py.
+
+POOL_SIZE = 16
+CONNECT_RETRIES = 2
+BACKOFF_FACTOR = 0.1
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def configure(pool_size: int = None, connect_retries: int = None, backoff_factor: float = None):
+    global POOL_SIZE, CONNECT_RETRIES, BACKOFF_FACTOR
+    if pool_size is not None:
+        POOL_SIZE = pool_size
+    if connect_retries is not None:
+        CONNECT_RETRIES = connect_retries
+    if backoff_factor is not None:
+        BACKOFF_FACTOR = backoff_factor
+    close()
+
+
+def create() -> requests.Session:
+    # Only failed connection attempts are retried here, since the request
+    # can't have reached the server; anything else may not be idempotent.
+    retry = Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES, read=0,
+                  status=0, other=0, backoff_factor=BACKOFF_FACTOR)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # The sessions are shared, so they don't keep cookies: each request is
+    # as stateless as a one-off one.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get(url: str) -> requests.Session:
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _lock:
+        if key not in _sessions:
+            _sessions[key] = create()
+        return _sessions[key]
+
+
+def close():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
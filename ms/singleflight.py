@@ -0,0 +1,68 @@
+import time
+import threading
+from typing import Optional, Callable
+
+
+# Coalescing of identical requests.
+#
+# While a request is in flight, identical requests (e.g. those of a parallel
+# map over duplicate inputs) don't go to the backend: they wait for the
+# first one and share its reply, or its error, whatever the exception. A
+# request that ends without a reply is not shared.
+
+class Flight():
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight():
+
+    def __init__(self):
+        self.flights = {}
+        self.leaders = 0
+        self.waiters = 0
+        self.max_waiters = 0
+        self.lock = threading.Lock()
+
+    # Returns the reply of fetch(), or of the identical request in flight,
+    # and whether it was shared.
+    def do(self, key, fetch: Callable[[], str], deadline: Optional[float] = None) -> tuple:
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+                self.leaders += 1
+            else:
+                flight.waiters += 1
+                self.waiters += 1
+        if not leader:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not flight.done.wait(timeout):
+                raise ValueError("Error: Deadline exceeded waiting for an identical request")
+            if flight.error is not None:
+                raise flight.error
+            if flight.reply is None:
+                raise ValueError("Error: The identical request in flight got no reply")
+            return flight.reply, True
+        try:
+            flight.reply = fetch()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+            flight.done.set()
+        return flight.reply, False
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.leaders, "waiters": self.waiters, "maxWaiters": self.max_waiters,
+                    "inFlight": len(self.flights)}
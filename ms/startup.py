@@ -44,6 +44,15 @@ def interpreter(interactive=False, backend:str=None):
     ip.define("sqrt", math.Sqrt(ip=ip))
     ip.define("log", math.Log(ip=ip))
     ip.define("pow", math.Pow(ip=ip))
+    ip.define("elementwise", math.Elementwise(ip=ip))
+    ip.define("add", math.Add(ip=ip))
+    ip.define("sub", math.Sub(ip=ip))
+    ip.define("mul", math.Mul(ip=ip))
+    ip.define("div", math.Div(ip=ip))
+    ip.define("sum", math.Sum(ip=ip))
+    ip.define("mean", math.Mean(ip=ip))
+    ip.define("dot", math.Dot(ip=ip))
+    ip.define("pack", math.Pack(ip=ip))
 
     ip.define("substr", string.SubStr(ip=ip))
     ip.define("toLower", string.ToLower(ip=ip))
@@ -55,6 +64,7 @@ def interpreter(interactive=False, backend:str=None):
     ip.define("join", string.Join(ip=ip))
     ip.define("match", string.Match(ip=ip))
     ip.define("replace", string.Replace(ip=ip))
+    ip.define("stringBuilder", string.StringBuilder(ip=ip))
 
     ip.define("iter", collections.Iter(ip=ip))
     ip.define("slice", collections.Slice(ip=ip))
@@ -68,6 +78,10 @@ def interpreter(interactive=False, backend:str=None):
     ip.define("exists", collections.Exists(ip=ip))
     ip.define("get", collections.Get(ip=ip))
     ip.define("set", collections.Set(ip=ip))
+    ip.define("sort", collections.Sort(ip=ip))
+    ip.define("binarySearch", collections.BinarySearch(ip=ip))
+    ip.define("heap", collections.Heap(ip=ip))
+    ip.define("pmap", collections.ParallelMap(ip=ip))
 
     ip.eval(network.HTTPParams)
     ip.define("http", network.HTTP(ip=ip))
@@ -75,6 +89,8 @@ def interpreter(interactive=False, backend:str=None):
     ip.define("tsNow", system.TsNow(ip=ip))
     ip.define("dateNow", system.DateNow(ip=ip))
     ip.define("random", system.Random(ip=ip))
+    ip.define("oracleStats", system.OracleStats(ip=ip))
+    ip.define("withDeadline", system.WithDeadline(ip=ip))
 
     # Register built-in symbols.
     with open("ms/lib/std.ms") as fh:
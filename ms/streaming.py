@@ -0,0 +1,109 @@
+import json
+from typing import Optional
+
+
+# Incremental scanning of streamed oracle replies.
+#
+# The scanner receives the reply piece by piece and reports when a complete
+# JSON value has been produced, so the rest of the generation can be
+# skipped. Using the output's JSON schema, it also rejects replies that
+# start with the wrong kind of value, or that leave the allowed enum values.
+
+STARTS = {
+    "object": "{",
+    "array": "[",
+    "string": "\"",
+    "integer": "-0123456789",
+    "number": "-0123456789",
+    "boolean": "tf",
+    "null": "n"
+}
+
+LITERALS = ["true", "false", "null"]
+
+
+class ValueScanner():
+
+    def __init__(self, schema: Optional[str] = None):
+        self.text = ""
+        self.start = None
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.starts = None
+        self.literals = None
+        if schema is not None:
+            self.expect(json.loads(schema))
+
+    # Oracles can always answer null, so it is accepted regardless of the schema.
+    def expect(self, schema: dict):
+        kinds = schema.get("type")
+        if type(kinds) == str:
+            kinds = [kinds]
+        if type(kinds) == list and all(kind in STARTS for kind in kinds):
+            self.starts = "".join(STARTS[kind] for kind in kinds + ["null"])
+        values = schema.get("enum")
+        if type(values) == list and all(type(value) not in [list, dict] for value in values):
+            # Non-ASCII characters may come raw (as the grammars have them) or escaped.
+            self.literals = [json.dumps(value, ensure_ascii=ascii) for value in values + [None]
+                             for ascii in [False, True]]
+
+    def invalid(self):
+        raise ValueError(f"Error: Unexpected reply: {self.text}")
+
+    # Adds a piece of the reply. Returns the value if it is complete.
+    def feed(self, piece: str) -> Optional[str]:
+        self.text += piece
+        text = self.text
+        while self.pos < len(text):
+            char = text[self.pos]
+            if self.start is None:
+                if not char.isspace():
+                    if self.starts is not None and char not in self.starts:
+                        self.invalid()
+                    self.start = self.pos
+                    if char in "{[":
+                        self.stack.append(char)
+                    elif char == "\"":
+                        self.in_string = True
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == "\"":
+                    self.in_string = False
+                    if not self.stack:
+                        return self.complete(self.pos + 1)
+            elif char == "\"":
+                self.in_string = True
+            elif char in "{[":
+                self.stack.append(char)
+            elif char in "}]":
+                if not self.stack or "{[}]".index(self.stack.pop()) != "{[}]".index(char) - 2:
+                    self.invalid()
+                if not self.stack:
+                    return self.complete(self.pos + 1)
+            elif not self.stack and (char.isspace() or char in ",}]"):
+                # The end of a number or literal.
+                return self.complete(self.pos)
+            self.pos += 1
+
+        if self.start is not None:
+            value = text[self.start:]
+            if self.literals is not None and not any(literal.startswith(value) for literal in self.literals):
+                self.invalid()
+            if not self.stack and value in LITERALS:
+                return self.complete(len(text))
+        return None
+
+    def complete(self, end: int) -> str:
+        value = self.text[self.start:end]
+        if self.literals is not None and value not in self.literals:
+            self.invalid()
+        return value
+
+    # Returns the reply once the stream has ended.
+    def finish(self) -> str:
+        return self.text.strip()
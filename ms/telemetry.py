@@ -0,0 +1,146 @@
+import json
+import threading
+from collections import deque
+from typing import Optional, List
+import ms.typecache
+
+
+# Per-oracle telemetry.
+#
+# Each oracle records its calls in an OracleStats object, and the backend
+# records the requests made on its behalf: their latency, the size of the
+# prompts and replies, the tokens used (if the API reports them), retries,
+# cache hits, requests coalesced with identical ones, and failures. Only
+# the requests actually sent count as requests. The statistics of all the
+# oracles are listed by the oracleStats() builtin, and can be dumped as
+# JSON at exit.
+
+SAMPLES = 4096
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class OracleStats():
+
+    def __init__(self, signature: str):
+        self.name = None
+        self.signature = signature
+        self.calls = 0
+        self.nulls = 0
+        self.requests = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.prompt_chars = 0
+        self.reply_chars = 0
+        self.tokens = 0
+        # The latencies of the most recent requests, in seconds.
+        self.latencies = deque(maxlen=SAMPLES)
+        self.total_latency = 0.0
+        self.lock = threading.Lock()
+
+    # Shared by the partial applications of the oracle.
+    def __deepcopy__(self, memo):
+        return self
+
+    def record_calls(self, count: int, nulls: int):
+        with self.lock:
+            self.calls += count
+            self.nulls += nulls
+
+    def record_request(self, latency: float, prompt: str, reply: Optional[str]):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            self.total_latency += latency
+            self.prompt_chars += len(prompt)
+            if reply is None:
+                self.failures += 1
+            else:
+                self.reply_chars += len(reply)
+
+    def record_cache_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+    # A request that waited for an identical one in flight.
+    def record_coalesced(self):
+        with self.lock:
+            self.coalesced += 1
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_tokens(self, tokens: int):
+        with self.lock:
+            self.tokens += tokens
+
+    def summary(self) -> dict:
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                "name": self.name,
+                "type": self.signature,
+                "calls": self.calls,
+                "nulls": self.nulls,
+                "requests": self.requests,
+                "failures": self.failures,
+                "cacheHits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "promptChars": self.prompt_chars,
+                "replyChars": self.reply_chars,
+                "tokens": self.tokens,
+                "latency": {
+                    "total": self.total_latency,
+                    "mean": self.total_latency / self.requests if self.requests else None,
+                    "p50": percentile(latencies, 0.50),
+                    "p95": percentile(latencies, 0.95),
+                    "p99": percentile(latencies, 0.99),
+                    "max": max(latencies) if latencies else None
+                }
+            }
+
+
+class Registry():
+
+    def __init__(self):
+        # The statistics of each oracle definition, by the definition's id
+        # (with the definition, which keeps the id from being reused).
+        self.oracles = {}
+        # Other statistics included in the dump, by name.
+        self.sections = {"typeCache": ms.typecache.cache.stats}
+        self.lock = threading.Lock()
+
+    # Oracles evaluated from the same definition (e.g. declared in a function
+    # called many times) share their statistics.
+    def register(self, signature: str, definition: object) -> OracleStats:
+        with self.lock:
+            entry = self.oracles.get(id(definition))
+            if entry is None:
+                entry = self.oracles[id(definition)] = (definition, OracleStats(signature))
+        return entry[1]
+
+    # The oracles that were called, the busiest first.
+    def summary(self) -> List[dict]:
+        with self.lock:
+            oracles = [stats for _, stats in self.oracles.values() if stats.calls > 0 or stats.requests > 0]
+        summaries = [stats.summary() for stats in oracles]
+        return sorted(summaries, key=lambda summary: -summary["latency"]["total"])
+
+    def dump(self, path: str):
+        report = {"oracles": self.summary()}
+        for name, stats in self.sections.items():
+            report[name] = stats()
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=4)
+
+
+registry = Registry()
@@ -0,0 +1,117 @@
+import json
+import threading
+from collections import OrderedDict
+import ms.ast as ast
+from ms.objects import MType
+
+
+# Process-wide cache of the JSON schemas and BNF grammars of types.
+#
+# Types are identified by a structural fingerprint: a canonical string of
+# the type with the named types resolved, so that equal types defined in
+# different places (or by different interpreters) share their entries.
+
+MAXSIZE = 4096
+
+
+class Fingerprint():
+
+    def __init__(self):
+        self.visiting = []
+
+    def annotate(self, node, text: str) -> str:
+        if node.annotation is not None:
+            return f"{text}#{json.dumps(node.annotation)}"
+        return text
+
+    def type_definition(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_annotation(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_terminal(self, node, env=None):
+        if node.token.ttype == ast.TokenType.ID:
+            name = node.token.literal
+            try:
+                value = env.get(name)
+            except KeyError:
+                raise KeyError(f"Unknown type '{name}'.")
+            if type(value) != MType:
+                raise ValueError(f"Referencing '{name}', which is not a type.")
+            # Recursive references point back to the enclosing definition.
+            if id(value.definition) in self.visiting:
+                return f"@{self.visiting.index(id(value.definition))}"
+            self.visiting.append(id(value.definition))
+            text = value.definition.accept(self, env=value.environment)
+            self.visiting.pop()
+            return self.annotate(node, f"({text})")
+        return self.annotate(node, node.token.literal)
+
+    def type_grouping(self, node, env=None):
+        return self.annotate(node, node.expr.accept(self, env=env))
+
+    def type_unary(self, node, env=None):
+        return self.annotate(node, f"?({node.expr.accept(self, env=env)})")
+
+    def type_binary(self, node, env=None):
+        left = node.left.accept(self, env=env)
+        right = node.right.accept(self, env=env)
+        return self.annotate(node, f"({left}->{right})")
+
+    def type_enum(self, node, env=None):
+        sub = node.type_expr.accept(self, env=env)
+        values = json.dumps(node.values.unwrap())
+        return self.annotate(node, f"Enum({sub},{values})")
+
+    def type_array(self, node, env=None):
+        return self.annotate(node, f"[{node.expr.accept(self, env=env)}]")
+
+    def type_map(self, node, env=None):
+        items = []
+        for key, expr in node.map.items():
+            required = "!" if key in node.required else ""
+            items.append(f"{json.dumps(key)}{required}:{expr.accept(self, env=env)}")
+        return self.annotate(node, "{" + ",".join(items) + "}")
+
+
+def fingerprint(value: MType) -> str:
+    return value.definition.accept(Fingerprint(), env=value.environment)
+
+
+class TypeCache():
+
+    def __init__(self, maxsize: int = MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Returns the cached output of a generator for the type, computing it
+    # if needed. Errors are not cached.
+    def get(self, kind: str, value: MType, generate):
+        key = (kind, fingerprint(value))
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        output = generate(value)
+        with self.lock:
+            self.entries[key] = output
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return output
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+cache = TypeCache()
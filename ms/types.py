@@ -1,7 +1,8 @@
 from typing import Optional, Any, List
 import copy
+from array import array
 import ms.ast as ast
-from ms.objects import MObject, MValue, MFunction, MType
+from ms.objects import MObject, MValue, MFunction, MType, ArrayView
 
 class TypeChecker():
 
@@ -37,11 +38,24 @@ class TypeChecker():
                     return True
                 elif type(v) == str and target.token.literal == "Str":
                     return True
-            elif type(v) == list and type(target) == ast.TypeArray:
+            elif type(v) in [list, ArrayView] and type(target) == ast.TypeArray:
                 starget = target.expr
+                if type(starget) == ast.TypeTerminal and starget.token.literal == "Any":
+                    # No need to visit the items.
+                    return True
                 if all(self._checktype_recursion(svalue, starget, env) for svalue in value.value):
                     return True
                 return False
+            elif type(v) == array and type(target) == ast.TypeArray:
+                # Packed arrays are checked by their item type, if possible.
+                [starget, senv] = self._resolve_type(target.expr, env)
+                if type(starget) == ast.TypeTerminal and starget.token.ttype == ast.TokenType.TYPE:
+                    if starget.token.literal in ["Any", "Num"]:
+                        return True
+                    elif starget.token.literal == "Int":
+                        return v.typecode == "q"
+                    return len(v) == 0
+                return all(self._checktype_recursion(MValue(item, None), starget, senv) for item in v)
             elif type(v) == dict and type(target) == ast.TypeMap:
                 required = list(target.required.keys())
                 for key in target.map.keys():
@@ -56,6 +70,9 @@ class TypeChecker():
                     return False
                 return True
             elif type(target) == ast.TypeEnum:
+                if target.index is not None:
+                    # A value that can't be hashed can't equal any indexed value.
+                    return MValue.hashkey(value) in target.index
                 for allowed in target.values.value:
                     if self.interpreter.compare(value, allowed):
                         return True
@@ -132,9 +149,10 @@ class TypeChecker():
         elif type1 == ast.TypeEnum and type2 == ast.TypeEnum:
             if not self._subtype_recursion(t1.type_expr, t2.type_expr, env1, env2):
                 return False
-            # TODO: Proper comparison of Enums requires comparing their contents,
-            # which in the ideal, efficient case would require additional machinery
-            # (e.g. recurisve value hashing). We'll brute-force here.
+            # Compare the contents using the value indexes if available,
+            # otherwise brute-force.
+            if t1.index is not None and t2.index is not None:
+                return t1.index <= t2.index
             for val1 in t1.values.value:
                 found = False
                 for val2 in t2.values.value:
@@ -177,7 +195,7 @@ class TypeChecker():
             elif type(v) == float:
                 valtype = ast.TypeTerminal(token=ast.Token(
                     ttype=ast.TokenType.TYPE, literal="Num"))
-            elif type(v) == list:
+            elif type(v) in [list, ArrayView]:
                 # We need to find a representative type for the list. The correct way of doing this
                 # is using Unification. But here we follow a simple approach.
                 # 1) If the list is empty, then type is Array.
@@ -217,6 +235,14 @@ class TypeChecker():
                     elif nullable:
                         gtype = ast.TypeUnary(expr=gtype)
                     valtype = ast.TypeArray(expr=gtype)
+            elif type(v) == array:
+                literal = "Int" if v.typecode == "q" else "Num"
+                if len(v) == 0:
+                    literal = "Any"
+                valtype = ast.TypeArray(
+                    expr=ast.TypeTerminal(
+                        token=ast.Token(
+                            ttype=ast.TokenType.TYPE, literal=literal)))
             elif type(v) == dict:
                 items = {}
                 for key, item in v.items():
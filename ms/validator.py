@@ -0,0 +1,202 @@
+import json
+from typing import Optional
+import ms.ast as ast
+from ms.objects import MObject, MValue, MType, ArrayView
+
+
+# Compiled validators.
+#
+# A Validator compiles a type once into a pair of functions: one decodes a
+# JSON value into MValues while checking it against the type, in a single
+# pass, and the other checks an MValue. Named types are resolved at compile
+# time, so the checks don't go through the environment for every value.
+# Values the compiled checks don't cover (functions, packed arrays) are
+# left to the interpreter's type checker.
+
+class Mismatch(Exception):
+    pass
+
+
+def decode_any(data):
+    return MValue.wrap(data)
+
+
+def check_any(value: MObject) -> bool:
+    return True
+
+
+PRIMITIVES = {
+    "Null": lambda v: v is None,
+    "Bool": lambda v: type(v) == bool,
+    "Int": lambda v: type(v) == int,
+    "Num": lambda v: type(v) == int or type(v) == float,
+    "Str": lambda v: type(v) == str
+}
+
+
+class Compiler():
+
+    def __init__(self, ip):
+        self.interpreter = ip
+        self.compiled = {}
+
+    def fallback(self, node, env):
+        checker = self.interpreter.checker
+
+        def decode(data):
+            value = MValue.wrap(data)
+            if not checker._checktype_recursion(value, node, env):
+                raise Mismatch()
+            return value
+
+        def check(value):
+            return checker._checktype_recursion(value, node, env)
+
+        return decode, check
+
+    def type_definition(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_annotation(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_grouping(self, node, env=None):
+        return node.expr.accept(self, env=env)
+
+    def type_terminal(self, node, env=None):
+        if node.token.ttype == ast.TokenType.ID:
+            name = node.token.literal
+            try:
+                value = env.get(name)
+            except KeyError:
+                raise KeyError(f"Unknown type '{name}'.")
+            if type(value) != MType:
+                raise ValueError(f"Referencing '{name}', which is not a type.")
+            key = id(value.definition)
+            if key not in self.compiled:
+                # Recursive references go through the table until compiled.
+                self.compiled[key] = (lambda data: self.compiled[key][0](data),
+                                      lambda value: self.compiled[key][1](value))
+                self.compiled[key] = value.definition.accept(self, env=value.environment)
+            return self.compiled[key]
+
+        literal = node.token.literal
+        if literal == "Any":
+            return decode_any, check_any
+        if literal not in PRIMITIVES:
+            return self.fallback(node, env)
+        accepts = PRIMITIVES[literal]
+
+        def decode(data):
+            if not accepts(data):
+                raise Mismatch()
+            return MValue(data, None)
+
+        def check(value):
+            return type(value) == MValue and accepts(value.value)
+
+        return decode, check
+
+    def type_unary(self, node, env=None):
+        decode_item, check_item = node.expr.accept(self, env=env)
+
+        def decode(data):
+            return MValue(None, None) if data is None else decode_item(data)
+
+        def check(value):
+            return (type(value) == MValue and value.value is None) or check_item(value)
+
+        return decode, check
+
+    def type_binary(self, node, env=None):
+        return self.fallback(node, env)
+
+    def type_enum(self, node, env=None):
+        if node.index is None:
+            return self.fallback(node, env)
+        index = node.index
+
+        def decode(data):
+            value = MValue.wrap(data)
+            if MValue.hashkey(value) not in index:
+                raise Mismatch()
+            return value
+
+        def check(value):
+            return type(value) == MValue and MValue.hashkey(value) in index
+
+        return decode, check
+
+    def type_array(self, node, env=None):
+        decode_item, check_item = node.expr.accept(self, env=env)
+        _, check_fallback = self.fallback(node, env)
+
+        def decode(data):
+            if type(data) != list:
+                raise Mismatch()
+            return MValue([decode_item(item) for item in data], None)
+
+        def check(value):
+            if type(value) != MValue:
+                return check_fallback(value)
+            if type(value.value) == list or type(value.value) == ArrayView:
+                return all(check_item(item) for item in value.value)
+            return check_fallback(value)
+
+        return decode, check
+
+    def type_map(self, node, env=None):
+        fields = {key: expr.accept(self, env=env) for key, expr in node.map.items()}
+        required = [key for key in node.map.keys() if key in node.required]
+
+        def decode(data):
+            if type(data) != dict:
+                raise Mismatch()
+            for key in required:
+                if key not in data:
+                    raise Mismatch()
+            values = {}
+            for key, item in data.items():
+                field = fields.get(key)
+                values[key] = MValue.wrap(item) if field is None else field[0](item)
+            return MValue(values, None)
+
+        def check(value):
+            if type(value) != MValue or type(value.value) != dict:
+                return False
+            for key in required:
+                if key not in value.value:
+                    return False
+            for key, (_, check_field) in fields.items():
+                if key in value.value and not check_field(value.value[key]):
+                    return False
+            return True
+
+        return decode, check
+
+
+class Validator():
+
+    def __init__(self, ip, value: MType):
+        self.interpreter = ip
+        compiler = Compiler(ip)
+        try:
+            self._decode, self._check = value.definition.accept(compiler, env=value.environment)
+        except (KeyError, ValueError):
+            # Unknown types are reported by the type checker when used.
+            self._decode, self._check = compiler.fallback(value.definition, value.environment)
+
+    # Returns the value of a JSON reply, or None if the reply isn't JSON or
+    # doesn't have the type.
+    def decode(self, code: str) -> Optional[MValue]:
+        try:
+            data = json.loads(code)
+        except (json.JSONDecodeError, TypeError):
+            return None
+        try:
+            return self._decode(data)
+        except (Mismatch, KeyError, ValueError, RecursionError):
+            return None
+
+    def check(self, value: MObject) -> bool:
+        return self._check(value)
@@ -0,0 +1,59 @@
+import ms.backend
+from ms.objects import MValue
+from ms.startup import interpreter
+
+
+class Scripted(ms.backend.LlamaCPP):
+    # A backend that replies to its requests, in order, with the given codes
+    # (or errors).
+
+    def __init__(self, replies: list, batch_size: int):
+        super().__init__()
+        self.replies = replies
+        self.batch_size = batch_size
+        self.prompts = []
+
+    def request(self, prompt, output_grammar, output_schema=None, deadline=None, affinity=None,
+                max_tokens=None, stats=None):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def lengths(replies: list, batch_size: int = 3):
+    backend = Scripted(replies, batch_size)
+    ip = interpreter(interactive=False, backend=backend)
+    oracle = ip.eval("oracle(word: Str) -> Int")
+    words = ["a", "bb", "ccc", "dddd", "eeeee"]
+    results = oracle.map([[MValue(word, None)] for word in words], concurrency=1)
+    return backend, oracle, results
+
+
+def test_batched_replies_are_split_into_outputs():
+    backend, oracle, results = lengths(["[1, 2, 3]", "[4, 5]"])
+    assert [value.value for value in results] == [1, 2, 3, 4, 5]
+    assert len(backend.prompts) == 2 and '"ccc"' in backend.prompts[0] and '"dddd"' in backend.prompts[1]
+    assert oracle.stats.calls == 5 and oracle.stats.requests == 2
+
+
+def test_missing_and_ill_typed_items_fall_back_to_single_calls():
+    # The first batch has an ill-typed item, the second is short by one.
+    backend, oracle, results = lengths(['[1, "two", 3]', "[4]", "2", "4", "5"])
+    assert [value.value for value in results] == [1, 2, 3, 4, 5]
+    assert len(backend.prompts) == 5
+    for prompt, word in zip(backend.prompts[2:], ["bb", "dddd", "eeeee"]):
+        assert f'"{word}"' in prompt and prompt.count('"a"') == 0
+    assert oracle.stats.requests == 5 and oracle.stats.nulls == 0
+
+
+def test_single_calls_that_fail_give_null():
+    backend, oracle, results = lengths(["[1, 2, 3]", "[4]", ValueError("Error: failed"), "5"])
+    assert [value.value for value in results] == [1, 2, 3, None, 5]
+    assert results[3].annotation == "Error: failed" and oracle.stats.nulls == 1
+
+
+def test_replies_that_arent_arrays_fall_back_to_single_calls():
+    backend, oracle, results = lengths(["4", "1", "2", "3", "4", "5"], batch_size=5)
+    assert [value.value for value in results] == [1, 2, 3, 4, 5]
@@ -0,0 +1,83 @@
+import pytest
+import ms.backend
+import ms.budget
+from ms.startup import interpreter
+from benchmarks import standin
+
+
+@pytest.fixture(scope="module")
+def ip():
+    return interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+
+
+def budget(ip, source: str):
+    return ms.budget.output_tokens(ip.eval(source))
+
+
+def test_llamacpp_sends_n_predict():
+    backend = ms.backend.LlamaCPP()
+    assert backend.preprocess("Prompt", "", 50)["json"]["n_predict"] == 50
+    data = backend.preprocess("Prompt", "")["json"]
+    assert data["n_predict"] == 1000 and "n_predit" not in data
+
+
+@pytest.mark.parametrize("cls", [ms.backend.GPT3Turbo, ms.backend.GPT4Turbo, ms.backend.GPT4o])
+def test_openai_backends_send_max_tokens(monkeypatch, cls):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    backend = cls()
+    assert backend.preprocess("Prompt", "", 50)["json"]["max_tokens"] == 50
+    assert backend.preprocess("Prompt", "")["json"]["max_tokens"] == 1000
+
+
+def test_budgets_of_bounded_types(ip):
+    slack = ms.budget.SLACK
+    assert budget(ip, "type Bool") == len("false") + slack
+    assert budget(ip, 'type Enum(Str, ["calm", "angry"])') == len('"angry"') + slack
+    assert budget(ip, "type {a!: Int, b: Bool}") == \
+        2 + (len('"a"') + 20 + 4) + (len('"b"') + 5 + 4) + slack
+    assert budget(ip, "type Bool?") == len("false") + slack
+
+
+def test_unbounded_types_have_no_budget(ip):
+    assert budget(ip, "type Str") is None
+    assert budget(ip, "type [Int]") is None
+    assert budget(ip, "type {a: Int, b: Str}") is None
+    assert budget(ip, "type Any") is None
+
+
+def test_annotations_override_the_budget(ip):
+    assert budget(ip, "# A haiku. Max tokens: 60.\ntype Str") == 60
+    assert budget(ip, "type {a: Int, b: # A short summary. max_tokens=40\nStr}") == \
+        2 + (len('"a"') + 20 + 4) + (len('"b"') + 40 + 4) + ms.budget.SLACK
+    oracle = ip.eval("# Writes a haiku. Max tokens: 60.\noracle(topic: Str) -> Str")
+    assert oracle.prepare_max_tokens() == 60
+    assert ip.eval("oracle(topic: Str) -> Bool").prepare_max_tokens() == budget(ip, "type Bool?")
+
+
+def test_batches_of_unbounded_outputs_get_the_default_for_each(ip):
+    assert ms.budget.batch_tokens(None, 4) is None
+    assert ms.budget.batch_tokens(None, 4, 1000) == ms.budget.batch_tokens(1000, 4)
+    assert ms.budget.batch_tokens(10, 4, 1000) == 4 * 12 + ms.budget.SLACK
+    oracle = ip.eval("oracle(text: Str) -> Str")
+    args = [[ip.eval('"x"')]] * 4
+    assert oracle.prepare_query(args)[4] == ms.budget.batch_tokens(ip.backend.max_tokens, 4)
+
+
+def test_oracle_budgets_reach_the_server():
+    requests = []
+
+    def reply(request):
+        requests.append(request)
+        return "true"
+
+    server = standin.serve(reply=reply)
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    ip = interpreter(interactive=False, backend=backend)
+    try:
+        assert ip.eval('(oracle(text: Str) -> Bool)("x")').value is True
+        ip.eval('(oracle(text: Str) -> Str)("x")')
+    finally:
+        server.shutdown()
+    assert requests[0]["n_predict"] == budget(ip, "type Bool?")
+    assert requests[1]["n_predict"] == backend.max_tokens
@@ -0,0 +1,22 @@
+import time
+import ms.backend
+from ms.startup import interpreter
+from benchmarks import standin
+
+
+def test_deadlines_propagate_to_oracle_calls():
+    server = standin.serve(reply="3", latency=1.0)
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    ip = interpreter(interactive=False, backend=backend)
+    ip.eval("let f = oracle(x: Str) -> Int")
+    try:
+        start = time.monotonic()
+        value = ip.eval('withDeadline(0.2, fun(_: Null) -> Any do f("a") end)')
+        assert value.value is None and time.monotonic() - start < 0.9
+        values = ip.eval('withDeadline(0.2, fun(_: Null) -> Any do pmap(f, ["a", "b"], 2) end)')
+        assert [value.value for value in values.value] == [None, None]
+        assert ip.deadline is None
+        assert ip.eval('f("a")').value == 3
+    finally:
+        server.shutdown()
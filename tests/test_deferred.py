@@ -0,0 +1,68 @@
+import json
+import pytest
+import ms.oracle
+import ms.backend
+from ms.deferred import Scheduler
+from ms.startup import interpreter
+from benchmarks import standin
+
+
+@pytest.fixture
+def lazy():
+    # An interpreter in lazy mode, whose oracle replies with the length of
+    # the text in the prompt, and the prompts it was sent.
+    prompts = []
+
+    def reply(request):
+        prompts.append(request["prompt"])
+        line = [line for line in request["prompt"].splitlines() if line.startswith("INPUT: ")][-1]
+        data = json.loads(line[len("INPUT: "):])
+        return json.dumps(len(data["text"] if "text" in data else data["r"]["text"]))
+
+    server = standin.serve(reply=reply)
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    scheduler = Scheduler(flush_size=4)
+    ms.oracle.configure(scheduler=scheduler, compact=True)
+    ip = interpreter(interactive=False, backend=backend)
+    ip.eval("let f = oracle(text: Str) -> Int")
+    yield ip, scheduler, prompts
+    ms.oracle.configure()
+    server.shutdown()
+
+
+def test_calls_are_deferred_until_used(lazy):
+    ip, scheduler, prompts = lazy
+    ip.eval('let y = f("abc")')
+    assert len(scheduler.pending) == 1 and prompts == []
+    assert ip.eval("y").value == 3
+    assert scheduler.pending == [] and len(prompts) == 1
+
+
+def test_pending_calls_are_flushed_at_the_flush_size(lazy):
+    ip, scheduler, prompts = lazy
+    ip.eval('let ys = [f("a"), f("ab"), f("abc")]')
+    assert len(scheduler.pending) == 3
+    ip.eval('let z = f("abcd")')
+    assert scheduler.pending == []
+    assert [value.value for value in ip.eval("ys").value] == [1, 2, 3]
+    assert ip.eval("z").value == 4
+
+
+def test_arguments_modified_after_the_call_dont_change_the_prompt(lazy):
+    ip, scheduler, prompts = lazy
+    ip.eval('let r = {text: "before"}')
+    ip.eval("let y = f(r.text)")
+    ip.eval('let g = oracle(r: {text: Str}) -> Int')
+    ip.eval("let z = g(r)")
+    ip.eval('r.text = "after it was called"')
+    assert ip.eval("y").value == len("before")
+    assert ip.eval("z").value == len("before")
+    assert not any("after it was called" in prompt for prompt in prompts)
+
+
+def test_outputs_of_the_wrong_type_resolve_to_null(lazy):
+    ip, scheduler, prompts = lazy
+    ip.eval('let g = oracle(text: Str) -> Str')
+    value = ip.eval('g("abc")')
+    assert value.value is None and value.annotation.startswith("Error")
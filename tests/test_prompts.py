@@ -0,0 +1,45 @@
+import ms.oracle
+import ms.backend
+from ms.startup import interpreter
+
+
+def spelling():
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    ip.eval('let bank = [[1, "one"], [2, "two"]]')
+    ip.eval('let spell = oracle(n: Int) -> Str from bank')
+    return ip, ip.eval("spell")
+
+
+def test_the_prefix_is_built_once():
+    ip, spell = spelling()
+    prompt = spell.prepare_prompt([ip.eval("3")])
+    prefix = spell.prefix
+    assert spell.prepare_prompt([ip.eval("4")]).startswith(prefix) and spell.prefix is prefix
+    assert '"two"' in prompt
+
+
+def test_examples_added_to_the_bank_reach_the_prompt():
+    ip, spell = spelling()
+    assert '"three"' not in spell.prepare_prompt([ip.eval("4")])
+    ip.eval('push(bank, [3, "three"])')
+    assert '"three"' in spell.prepare_prompt([ip.eval("4")])
+
+
+def test_examples_changed_after_a_copy_on_write_reach_the_prompt():
+    ip, spell = spelling()
+    ip.eval("let first = slice(bank, 0, 1)")
+    spell.prepare_prompt([ip.eval("4")])
+    ip.eval('bank[1] = [2, "deux"]')
+    prompt = spell.prepare_prompt([ip.eval("4")])
+    assert '"deux"' in prompt and '"two"' not in prompt
+
+
+def test_the_retrieval_index_follows_the_bank():
+    ip, spell = spelling()
+    ms.oracle.configure(top_k=1)
+    try:
+        spell.prepare_prompt([ip.eval("2")])
+        ip.eval('push(bank, [3, "three"])')
+        assert '"three"' in spell.prepare_prompt([ip.eval("3")])
+    finally:
+        ms.oracle.configure()
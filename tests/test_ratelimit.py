@@ -0,0 +1,171 @@
+import pytest
+import ms.ratelimit
+from ms.ratelimit import RateLimiter, ConcurrencyController, parse_duration
+
+
+class Clock():
+    # Replaces the time module of ms.ratelimit: sleeping advances the time.
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ms.ratelimit, "time", clock)
+    return clock
+
+
+def test_request_bucket_refills_at_its_rate(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        limiter.acquire(0)
+    assert clock.slept == []
+    limiter.acquire(0)
+    assert clock.slept == [pytest.approx(1.0)]
+    clock.now += 10.0
+    for _ in range(10):
+        limiter.acquire(0)
+    assert len(clock.slept) == 1
+
+
+def test_token_bucket_waits_for_the_tokens(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(500)
+    limiter.acquire(200)
+    assert clock.slept == [pytest.approx(10.0)]
+    assert limiter.waited == pytest.approx(10.0)
+
+
+def test_requests_larger_than_the_bucket_wait_for_a_full_bucket(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(100)
+    limiter.acquire(1000)
+    assert clock.slept == [pytest.approx(10.0)]
+
+
+def test_settle_charges_the_tokens_actually_used(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(100)
+    limiter.settle(100, 400)
+    assert limiter.tokens.level == pytest.approx(200)
+    limiter.settle(100, 50)
+    assert limiter.tokens.level == pytest.approx(250)
+
+
+def test_headers_clamp_the_buckets(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    limiter.update({"x-ratelimit-remaining-requests": "5", "x-ratelimit-remaining-tokens": "100"})
+    assert limiter.requests.level == 5 and limiter.tokens.level == 100
+    # Headers never raise the level above what the bucket has.
+    limiter.update({"x-ratelimit-remaining-requests": "50"})
+    assert limiter.requests.level == 5
+    limiter.update({"x-ratelimit-remaining-requests": "n/a"})
+    assert limiter.requests.level == 5
+
+
+def test_exhausted_quota_blocks_until_the_reset(clock):
+    limiter = RateLimiter(requests_per_minute=600)
+    limiter.update({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"})
+    limiter.acquire(0)
+    assert clock.slept == [pytest.approx(360.0)]
+
+
+def test_retry_after_blocks(clock):
+    limiter = RateLimiter()
+    limiter.update({"retry-after": "2"})
+    limiter.acquire(0)
+    assert clock.slept == [pytest.approx(2.0)]
+
+
+def test_acquire_fails_if_the_wait_exceeds_the_deadline(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        limiter.acquire(0)
+    with pytest.raises(ValueError):
+        limiter.acquire(0, deadline=clock.now + 0.5)
+    assert clock.slept == []
+    limiter.acquire(0, deadline=clock.now + 2.0)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_parse_duration():
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("6m0s") == 360.0
+    assert parse_duration("1h2m") == 3720.0
+    assert parse_duration("3") == 3.0
+    assert parse_duration("soon") is None
+
+
+def test_limit_grows_additively_with_good_latencies(clock):
+    controller = ConcurrencyController(initial=4, maximum=5)
+    for _ in range(4):
+        controller.acquire()
+    assert controller.inflight == 4
+    for _ in range(4):
+        controller.release(1.0)
+    assert controller.limit == pytest.approx(5.0, abs=0.1) and controller.limit < 5.0
+    for _ in range(10):
+        controller.acquire()
+        controller.release(1.0)
+    assert controller.limit == 5
+
+
+def test_limit_halves_on_slow_replies_once_per_round(clock):
+    controller = ConcurrencyController(initial=8)
+    controller.acquire()
+    controller.release(1.0)
+    limit = controller.limit
+    for _ in range(2):
+        controller.acquire()
+    controller.release(3.0)
+    assert controller.limit == pytest.approx(limit / 2)
+    # Sent before the decrease, so it doesn't decrease the limit again.
+    controller.release(3.0)
+    assert controller.limit == pytest.approx(limit / 2)
+    clock.now += 10.0
+    controller.acquire()
+    controller.release(3.0)
+    assert controller.limit == pytest.approx(limit / 4)
+
+
+def test_limit_halves_on_rate_limiting_down_to_the_minimum(clock):
+    controller = ConcurrencyController(initial=4, minimum=1, latency_target=5.0)
+    for _ in range(4):
+        controller.acquire()
+        controller.release(0.1, congested=True)
+        clock.now += 1.0
+    assert controller.limit == 1
+    controller.acquire()
+    controller.release(None)
+    assert controller.limit == 1 and controller.inflight == 0
+
+
+def test_latency_target(clock):
+    controller = ConcurrencyController(initial=4, latency_target=5.0)
+    controller.acquire()
+    controller.release(4.0)
+    assert controller.limit > 4
+    controller.acquire()
+    controller.release(6.0)
+    assert controller.limit < 4
+
+
+def test_acquire_fails_at_the_deadline_when_the_limit_is_reached(clock):
+    controller = ConcurrencyController(initial=1)
+    controller.acquire()
+    with pytest.raises(ValueError):
+        controller.acquire(deadline=clock.now)
+    controller.release(1.0)
+    controller.acquire(deadline=clock.now)
+    assert controller.inflight == 1
@@ -0,0 +1,57 @@
+import pytest
+import ms.backend
+from ms.reliability import TransientError, CircuitBreaker
+
+
+def backend_with(replies: list) -> ms.backend.Backend:
+    # A backend whose requests return (or raise) the given replies in turn.
+    backend = ms.backend.LlamaCPP()
+    backend.breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+
+    def request(*args):
+        reply = replies.pop(0)
+        if isinstance(reply, BaseException):
+            raise reply
+        return reply
+
+    backend.request = request
+    return backend
+
+
+def test_breaker_opens_on_transient_failures_and_closes_after_a_good_probe():
+    backend = backend_with([TransientError("Error: down"), "1"])
+    with pytest.raises(TransientError):
+        backend.attempt("Prompt", "")
+    assert backend.breaker.state() == "open"
+    assert backend.attempt("Prompt", "") == "1"
+    assert backend.breaker.state() == "closed"
+
+
+def test_breaker_stays_open_while_the_cooldown_lasts():
+    backend = backend_with([TransientError("Error: down"), "1"])
+    backend.breaker.cooldown = 60.0
+    with pytest.raises(TransientError):
+        backend.attempt("Prompt", "")
+    with pytest.raises(TransientError, match="Too many failures"):
+        backend.attempt("Prompt", "")
+
+
+@pytest.mark.parametrize("error", [ValueError("Error: 400 Bad Request"),
+                                   ValueError("Error: Deadline exceeded"), KeyError("content")])
+def test_a_probe_failing_with_another_error_is_released(error):
+    backend = backend_with([TransientError("Error: down"), error, "1"])
+    with pytest.raises(TransientError):
+        backend.attempt("Prompt", "")
+    with pytest.raises(type(error)):
+        backend.attempt("Prompt", "")
+    assert backend.breaker.state() == "open"
+    assert backend.attempt("Prompt", "") == "1"
+    assert backend.breaker.state() == "closed"
+
+
+def test_other_errors_dont_open_the_breaker():
+    backend = backend_with([ValueError("Error: 400 Bad Request"), "1"])
+    with pytest.raises(ValueError):
+        backend.attempt("Prompt", "")
+    assert backend.breaker.state() == "closed"
+    assert backend.attempt("Prompt", "") == "1"
@@ -0,0 +1,105 @@
+import time
+import json
+import pytest
+import ms.oracle
+import ms.replay
+import ms.backend
+from ms.cache import ResponseCache
+from ms.startup import interpreter
+
+
+class Stub(ms.backend.LlamaCPP):
+    # A backend that answers with the number of characters of the input,
+    # after a delay.
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.requests = 0
+
+    def request(self, prompt, output_grammar, output_schema=None, deadline=None, affinity=None,
+                max_tokens=None, stats=None):
+        self.requests += 1
+        time.sleep(self.delay)
+        line = [line for line in prompt.splitlines() if line.startswith("INPUT:")][-1]
+        return str(len(json.loads(line[len("INPUT:"):])["text"]))
+
+
+def run(backend, texts: list) -> list:
+    ip = interpreter(interactive=False, backend=backend)
+    ip.eval("let count = oracle(text: Str) -> Int")
+    return [ip.eval(f'count("{text}")').value for text in texts]
+
+
+@pytest.fixture
+def compact():
+    ms.oracle.configure(compact=True)
+    yield
+    ms.oracle.configure()
+
+
+def record(path, texts: list, delay: float = 0.0, cache: bool = False) -> list:
+    backend = Stub(delay)
+    backend.recorder = ms.replay.Recorder(str(path))
+    if cache:
+        backend.cache = ResponseCache(nondeterministic=True)
+    try:
+        return run(backend, texts)
+    finally:
+        backend.recorder.close()
+
+
+def test_recorded_replies_are_replayed_offline(tmp_path, compact):
+    path = tmp_path / "replies.jsonl"
+    assert record(path, ["a", "bb", "ccc"]) == [1, 2, 3]
+    records = ms.replay.load(str(path))
+    assert len(records) == 3 and {record["reply"] for record in records} == {"1", "2", "3"}
+    replay = ms.backend.Replay(str(path))
+    assert run(replay, ["ccc", "a", "bb"]) == [3, 1, 2]
+    # Prompts that weren't recorded have no reply.
+    assert run(replay, ["dddd"]) == [None]
+
+
+def test_replies_are_looked_up_by_prompt_and_grammar(tmp_path):
+    path = tmp_path / "replies.jsonl"
+    recorder = ms.replay.Recorder(str(path))
+    recorder.record("Prompt\n", "root ::= [0-9]", "1", 0.0)
+    recorder.record("Prompt", "root ::= [a-z]", '"a"', 0.0)
+    recorder.record("Prompt", "root ::= [0-9]", "2", 0.0)
+    recorder.close()
+    replay = ms.backend.Replay(str(path))
+    assert replay.consult("Prompt   \n", "root ::= [0-9]") == "1"
+    assert replay.consult("Prompt", "root ::= [a-z]") == '"a"'
+    # Prompts recorded several times are answered in turn.
+    assert replay.consult("Prompt", "root ::= [0-9]") == "2"
+    assert replay.consult("Prompt", "root ::= [0-9]") == "1"
+    with pytest.raises(ValueError):
+        replay.consult("Other prompt", "root ::= [0-9]")
+
+
+def test_replay_injects_the_latency(tmp_path, compact):
+    path = tmp_path / "replies.jsonl"
+    record(path, ["a", "bb"], delay=0.1)
+    assert all(record["latency"] >= 0.1 for record in ms.replay.load(str(path)))
+    for latency, low, high in [("none", 0.0, 0.05), ("recorded", 0.2, 0.35), ("fixed:0.15", 0.3, 0.45)]:
+        start = time.monotonic()
+        assert run(ms.backend.Replay(str(path), latency), ["a", "bb"]) == [1, 2]
+        assert low <= time.monotonic() - start < high
+
+
+def test_cache_hits_arent_recorded(tmp_path, compact):
+    path = tmp_path / "replies.jsonl"
+    assert record(path, ["a", "a", "bb", "a"], cache=True) == [1, 1, 2, 1]
+    assert len(ms.replay.load(str(path))) == 2
+
+
+def test_latency_models():
+    assert ms.replay.latency_model("none")(3.0) == 0.0
+    assert ms.replay.latency_model("recorded")(3.0) == 3.0
+    assert ms.replay.latency_model("fixed:2")(3.0) == 2.0
+    assert 1.0 <= ms.replay.latency_model("uniform:1:2", seed=0)(3.0) <= 2.0
+    assert ms.replay.latency_model("lognormal:1:0.5", seed=0)(3.0) > 0.0
+    with pytest.raises(ValueError):
+        ms.replay.latency_model("uniform:1")
+    with pytest.raises(ValueError):
+        ms.replay.latency_model("poisson:1")
@@ -0,0 +1,68 @@
+import pytest
+import ms.oracle
+import ms.backend
+from ms.objects import MValue
+from ms.oracle import estimate_tokens
+from ms.retrieval import BM25Index, tokenize
+from ms.startup import interpreter
+
+
+def test_tokenize():
+    assert tokenize("The cat's mat, 2 times!") == ["the", "cat", "s", "mat", "2", "times"]
+
+
+def test_ranking():
+    index = BM25Index(["the cat sat on the mat", "dogs bark at night", "a cat and a dog"])
+    # Shorter documents with the term rank first.
+    assert index.rank("cat") == [2, 0, 1]
+    # Rarer terms weigh more.
+    assert index.rank("cat night") == [1, 2, 0]
+    assert index.scores("Cat")[0] > 0 and index.scores("cat")[1] == 0
+    # Equally relevant documents keep their order.
+    assert index.rank("unknown") == [0, 1, 2]
+    assert BM25Index([]).rank("cat") == []
+
+
+@pytest.fixture
+def oracle():
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    ip.eval('let animals = [["the cat sat on the mat", 1], ["dogs bark at night", 2], '
+            '["birds fly south in winter", 3]]')
+    yield ip.eval("oracle(text: Str) -> Int from animals")
+    ms.oracle.configure()
+
+
+def examples_in(prompt: str) -> list:
+    return [text for text in ["the cat sat on the mat", "dogs bark at night", "birds fly south in winter"]
+            if text in prompt]
+
+
+def prompt(oracle, text: str) -> str:
+    return oracle.prepare_prompt([MValue(text, None)])
+
+
+def test_without_selection_all_the_examples_are_used(oracle):
+    assert len(examples_in(prompt(oracle, "a dog at night"))) == 3
+
+
+def test_top_k_keeps_the_most_relevant_examples_in_order(oracle):
+    ms.oracle.configure(top_k=1)
+    assert examples_in(prompt(oracle, "a dog at night")) == ["dogs bark at night"]
+    ms.oracle.configure(top_k=2)
+    assert examples_in(prompt(oracle, "birds and a cat")) == ["the cat sat on the mat", "birds fly south in winter"]
+
+
+def test_budget_truncates_the_examples(oracle):
+    text = "a dog at night"
+    full = prompt(oracle, text)
+    query = full[len(oracle.prefix):]
+    header = oracle.header
+    one = max(estimate_tokens(example) for example in oracle.rendered)
+    # Room for the header, the query and a single example.
+    ms.oracle.configure(budget=estimate_tokens(header) + estimate_tokens(query) + one)
+    assert examples_in(prompt(oracle, text)) == ["dogs bark at night"]
+    # No room for any example.
+    ms.oracle.configure(budget=estimate_tokens(header) + estimate_tokens(query))
+    assert examples_in(prompt(oracle, text)) == [] and prompt(oracle, text).startswith(header)
+    ms.oracle.configure(budget=10 ** 6)
+    assert prompt(oracle, text) == full
@@ -0,0 +1,77 @@
+import json
+import ms.backend
+from ms.startup import interpreter
+from ms.schema import JSONSchema, OUTPUT_KEY, strict_schema, unwrap_output
+from benchmarks import standin
+
+PERSON = 'type {name!: Str, age: Int, mood: Enum(Str, ["calm", "angry"]), tags!: [Str]}'
+
+
+def printed(source: str) -> str:
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    return JSONSchema(ip).print_schema(ip.eval(source))
+
+
+def test_strict_schema_wraps_the_output_and_makes_it_nullable():
+    schema = strict_schema(printed("type Int"))
+    assert schema == {
+        "type": "object",
+        "properties": {OUTPUT_KEY: {"type": ["integer", "null"]}},
+        "required": [OUTPUT_KEY],
+        "additionalProperties": False
+    }
+
+
+def test_strict_schema_requires_all_properties_and_makes_optional_ones_nullable():
+    output = strict_schema(printed(PERSON))["properties"][OUTPUT_KEY]
+    assert output["type"] == ["object", "null"]
+    assert output["required"] == ["name", "age", "mood", "tags"]
+    assert output["additionalProperties"] is False
+    properties = output["properties"]
+    assert properties["name"] == {"type": "string"}
+    assert properties["age"] == {"type": ["integer", "null"]}
+    assert properties["mood"] == {"type": ["string", "null"], "enum": ["calm", "angry", None]}
+    assert properties["tags"] == {"type": "array", "items": {"type": "string"}}
+
+
+def test_strict_schema_doesnt_modify_the_printed_schema():
+    schema = printed(PERSON)
+    strict_schema(schema)
+    assert json.loads(schema)["properties"]["mood"]["enum"] == ["calm", "angry"]
+
+
+def test_types_without_strict_equivalent_give_none():
+    assert strict_schema(printed("type Any")) is None
+    assert strict_schema(printed("type {data: Any}")) is None
+
+
+def test_unwrap_output_drops_null_optional_properties():
+    schema = printed(PERSON)
+    reply = json.dumps({OUTPUT_KEY: {"name": "Ann", "age": None, "mood": None, "tags": []}})
+    assert json.loads(unwrap_output(schema, reply)) == {"name": "Ann", "tags": []}
+    reply = json.dumps({OUTPUT_KEY: [{"name": "Bo", "age": 3, "mood": "calm", "tags": ["x"]}]})
+    assert json.loads(unwrap_output(printed(f"type [{PERSON[5:]}]"), reply)) == \
+        [{"name": "Bo", "age": 3, "mood": "calm", "tags": ["x"]}]
+    assert unwrap_output(schema, json.dumps({OUTPUT_KEY: None})) == "null"
+
+
+def test_openai_backend_sends_the_strict_schema_and_unwraps_the_reply(monkeypatch):
+    requests = []
+
+    def reply(request):
+        requests.append(request)
+        return json.dumps({OUTPUT_KEY: {"name": "Ann", "age": None, "mood": "calm", "tags": []}})
+
+    server = standin.serve(reply=reply)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_BASE_URL", standin.url(server, "/v1"))
+    try:
+        backend = ms.backend.GPT4o()
+        schema = printed(PERSON)
+        code = backend.consult("Prompt", "", schema)
+    finally:
+        server.shutdown()
+    assert json.loads(code) == {"name": "Ann", "mood": "calm", "tags": []}
+    response_format = requests[0]["response_format"]
+    assert response_format["type"] == "json_schema" and response_format["json_schema"]["strict"] is True
+    assert response_format["json_schema"]["schema"] == strict_schema(schema)
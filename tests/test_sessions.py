@@ -0,0 +1,34 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import ms.sessions
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get("Cookie"))
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session=secret; Path=/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def test_pooled_sessions_are_reused_and_keep_no_cookies():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CookieHandler)
+    server.cookies = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        session = ms.sessions.get(url)
+        assert ms.sessions.get(url) is session
+        session.get(url)
+        session.get(url)
+        assert server.cookies == [None, None]
+        assert len(session.cookies) == 0
+    finally:
+        server.shutdown()
+        ms.sessions.close()
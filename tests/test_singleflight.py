@@ -0,0 +1,110 @@
+import time
+import threading
+import pytest
+import ms.backend
+from ms.cache import ResponseCache
+from ms.singleflight import SingleFlight
+
+
+def run_waiters(flight: SingleFlight, key, count: int, started: threading.Event) -> list:
+    # Waits until the leader is in flight, then starts identical requests.
+    results = [None] * count
+
+    def wait(index):
+        try:
+            results[index] = flight.do(key, lambda: "not shared")
+        except BaseException as e:
+            results[index] = e
+
+    started.wait()
+    threads = [threading.Thread(target=wait, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["waiters"] < count:
+        pass
+    return threads, results
+
+
+def lead(flight: SingleFlight, key, fetch, count: int = 4):
+    started = threading.Event()
+    release = threading.Event()
+
+    def leader():
+        started.set()
+        release.wait()
+        return fetch()
+
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = flight.do(key, leader)
+        except BaseException as e:
+            outcome["result"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    threads, results = run_waiters(flight, key, count, started)
+    release.set()
+    for t in threads + [thread]:
+        t.join()
+    return outcome["result"], results
+
+
+def test_waiters_share_the_reply():
+    flight = SingleFlight()
+    result, results = lead(flight, "k", lambda: "3")
+    assert result == ("3", False)
+    assert results == [("3", True)] * 4
+    assert flight.stats() == {"requests": 1, "waiters": 4, "maxWaiters": 4, "inFlight": 0}
+
+
+@pytest.mark.parametrize("error", [ValueError("Error: failed"), KeyError("content"), KeyboardInterrupt()])
+def test_waiters_get_the_error_of_the_leader(error):
+    def fail():
+        raise error
+    flight = SingleFlight()
+    result, results = lead(flight, "k", fail)
+    assert result is error
+    assert all(item is error for item in results)
+    assert flight.stats()["inFlight"] == 0
+
+
+def test_no_reply_is_not_shared():
+    flight = SingleFlight()
+    result, results = lead(flight, "k", lambda: None)
+    assert result == (None, False)
+    assert all(type(item) == ValueError for item in results)
+
+
+def test_different_keys_dont_wait():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: "1") == ("1", False)
+    assert flight.do("a", lambda: "2") == ("2", False)
+    assert flight.do("b", lambda: "3") == ("3", False)
+
+
+def test_waiters_time_out_at_the_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    thread = threading.Thread(target=flight.do, args=("k", lambda: release.wait() and "1"))
+    thread.start()
+    while flight.stats()["inFlight"] == 0:
+        pass
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: "2", time.monotonic() + 0.05)
+    release.set()
+    thread.join()
+
+
+def test_missing_replies_arent_cached():
+    backend = ms.backend.LlamaCPP()
+    backend.cache = ResponseCache(nondeterministic=True)
+    backend.singleflight = SingleFlight()
+    replies = [None, "3"]
+    backend.attempt = lambda *args: replies.pop(0)
+    assert backend.consult("Prompt", "") is None
+    assert len(backend.cache.entries) == 0
+    assert backend.consult("Prompt", "") == "3"
+    assert backend.consult("Prompt", "") == "3"
+    assert replies == [] and backend.cache.hits == 1
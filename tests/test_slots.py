@@ -0,0 +1,45 @@
+import ms.backend
+from benchmarks import standin
+
+
+def test_pool_with_slots_sends_slot_ids():
+    requests = []
+
+    def reply(request):
+        requests.append(request)
+        return "1"
+
+    servers = [standin.serve(reply=reply) for _ in range(2)]
+    backend = ms.backend.LlamaCPPPool([standin.url(server) for server in servers])
+    backend.slots = 2
+    try:
+        for affinity in ["a", "b", "c", "a"]:
+            assert backend.consult("Prompt", "root ::= [0-9]", affinity=affinity) == "1"
+    finally:
+        for server in servers:
+            server.shutdown()
+    slots = [request["id_slot"] for request in requests]
+    assert all(type(slot) == int and 0 <= slot < 2 for slot in slots)
+    assert slots[0] == slots[3]
+
+
+def test_slot_affinity_reuses_the_cached_prefix():
+    prefix = "Examples. " * 40
+
+    def evaluated(slots):
+        server = standin.serve(reply="1", slots=2)
+        backend = ms.backend.LlamaCPP()
+        backend.url = standin.url(server)
+        backend.slots = slots
+        try:
+            for n in range(2):
+                backend.consult(prefix + f"Input {n}.", "root ::= [0-9]", affinity="a")
+        finally:
+            server.shutdown()
+        return server.evaluated
+
+    # The server puts the second request in the other slot, unless asked
+    # for the slot of the first, which has all but the end of the prompt.
+    tokens = len(prefix + "Input 0.") // 4
+    assert evaluated(None) == 2 * tokens
+    assert evaluated(2) == tokens
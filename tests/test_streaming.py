@@ -0,0 +1,65 @@
+import json
+import pytest
+from ms.streaming import ValueScanner
+
+
+def feed(scanner: ValueScanner, pieces):
+    for piece in pieces:
+        value = scanner.feed(piece)
+        if value is not None:
+            return value
+    return None
+
+
+def test_object_completes_at_its_closing_brace():
+    scanner = ValueScanner()
+    assert feed(scanner, ['  {"a": [1, ', '{"b": "}"}', ']}', ' trailing']) == '{"a": [1, {"b": "}"}]}'
+
+
+def test_string_with_escaped_quotes():
+    assert feed(ValueScanner(), ['"say \\"', 'hi\\""', ' more']) == '"say \\"hi\\""'
+
+
+def test_number_completes_at_its_end():
+    scanner = ValueScanner()
+    assert feed(scanner, ["-12", "3.5"]) is None
+    assert scanner.feed("\n") == "-123.5"
+
+
+def test_literals_complete_without_a_delimiter():
+    assert feed(ValueScanner(), ["tr", "ue"]) == "true"
+    assert feed(ValueScanner(), ["nu", "ll"]) == "null"
+
+
+def test_truncated_reply_is_not_complete():
+    scanner = ValueScanner()
+    assert feed(scanner, ['{"a": [1, 2']) is None
+    assert scanner.finish() == '{"a": [1, 2'
+
+
+def test_mismatched_brackets_are_rejected():
+    with pytest.raises(ValueError):
+        feed(ValueScanner(), ['{"a": 1]'])
+
+
+def test_schema_rejects_the_wrong_kind_of_value():
+    schema = json.dumps({"type": "integer"})
+    with pytest.raises(ValueError):
+        feed(ValueScanner(schema), ['"12"'])
+    assert feed(ValueScanner(schema), ["null"]) == "null"
+    assert feed(ValueScanner(schema), ["42 "]) == "42"
+
+
+def test_schema_rejects_values_outside_the_enum_early():
+    schema = json.dumps({"type": "string", "enum": ["yes", "no"]})
+    with pytest.raises(ValueError):
+        feed(ValueScanner(schema), ['"ma'])
+    assert feed(ValueScanner(schema), ['"y', 'es"']) == '"yes"'
+
+
+def test_enum_values_with_non_ascii_characters():
+    schema = json.dumps({"type": "string", "enum": ["café", "thé"]})
+    assert feed(ValueScanner(schema), ['"caf', 'é"']) == '"café"'
+    assert feed(ValueScanner(schema), ['"th\\u00', 'e9"']) == '"th\\u00e9"'
+    with pytest.raises(ValueError):
+        feed(ValueScanner(schema), ['"cafe"'])
@@ -0,0 +1,36 @@
+import ms.backend
+import ms.telemetry
+from ms.cache import ResponseCache
+from ms.startup import interpreter
+from benchmarks import standin
+
+
+def test_only_requests_sent_are_recorded():
+    server = standin.serve(reply="3")
+    backend = ms.backend.LlamaCPP()
+    backend.url = standin.url(server)
+    backend.cache = ResponseCache(nondeterministic=True)
+    ip = interpreter(interactive=False, backend=backend)
+    ip.eval('let countOnly = oracle(x: Str) -> Int')
+    try:
+        for _ in range(3):
+            assert ip.eval('countOnly("a")').value == 3
+    finally:
+        server.shutdown()
+    stats = ip.eval("countOnly").stats.summary()
+    assert stats["calls"] == 3
+    assert stats["requests"] == 1 and stats["cacheHits"] == 2
+    assert server.requests == 1
+
+
+def test_oracles_from_the_same_definition_share_their_stats():
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    ip.eval('let make = fun(_: Null) -> Any do oracle(x: Str) -> Int end')
+    before = len(ms.telemetry.registry.oracles)
+    first = ip.eval('make(null)')
+    for _ in range(199):
+        last = ip.eval('make(null)')
+    assert len(ms.telemetry.registry.oracles) == before + 1
+    assert first is not last and first.stats is last.stats
+    other = ip.eval('oracle(x: Str) -> Int')
+    assert other.stats is not first.stats
@@ -0,0 +1,113 @@
+import itertools
+import pytest
+import ms.backend
+from ms.bnf import BNFFormatter
+from ms.schema import JSONSchema
+from ms.startup import interpreter
+from ms.typecache import TypeCache, fingerprint
+
+
+def new_interpreter(definitions: str = ""):
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    if definitions:
+        ip.eval(definitions)
+    return ip
+
+
+@pytest.fixture(scope="module")
+def ip():
+    return new_interpreter("""
+let A = type {x: Int}
+let B = type {x: Str}
+# A person.
+let Person = type {name!: Str}
+# A pet.
+let Pet = type {name!: Str}
+let Tree = type {value!: Int, children: [Tree]}
+let Chain = type {value!: Int, children: Chain?}
+""")
+
+
+# Types that differ, if only slightly.
+DIFFERENT = [
+    # Annotations, on the type and on fields.
+    "type Str",
+    "# A name.\ntype Str",
+    "# A title.\ntype Str",
+    "type {a: # A name.\nStr}",
+    "type {a: # A title.\nStr}",
+    # Enum values and their types.
+    'type Enum(Str, ["a", "b"])',
+    'type Enum(Str, ["a", "c"])',
+    'type Enum(Str, ["b", "a"])',
+    'type Enum(Str, ["1"])',
+    "type Enum(Int, [1])",
+    "type Enum(Num, [1])",
+    "type Enum(Num, [1.5])",
+    # Optional and nullable fields.
+    "type {a: Str}",
+    "type {a!: Str}",
+    "type {a: Str?}",
+    "type {a!: Str?}",
+    "type {a: Str, b: Str}",
+    "type {b: Str}",
+    "type Str?",
+    # Referenced types.
+    "type [A]",
+    "type [B]",
+    "type [Person]",
+    "type [Pet]",
+    "type Tree",
+    "type Chain",
+    "type [Int]",
+    "type [Num]",
+    "type Int -> Str",
+    "type Str -> Int",
+]
+
+
+def test_different_types_have_different_fingerprints(ip):
+    fingerprints = {source: fingerprint(ip.eval(source)) for source in DIFFERENT}
+    for (s1, f1), (s2, f2) in itertools.combinations(fingerprints.items(), 2):
+        assert f1 != f2, f"{s1!r} and {s2!r} share a fingerprint"
+
+
+def test_same_names_for_different_types_in_other_interpreters(ip):
+    other = new_interpreter("let A = type {x: Str}")
+    assert fingerprint(other.eval("type [A]")) != fingerprint(ip.eval("type [A]"))
+    assert fingerprint(other.eval("type [A]")) == fingerprint(ip.eval("type [B]"))
+
+
+def test_equal_types_share_a_fingerprint(ip):
+    assert fingerprint(ip.eval("type {x: Int}")) == fingerprint(ip.eval("type {x: Int}"))
+    other = new_interpreter("let Node = type {value!: Int, children: [Node]}")
+    assert fingerprint(other.eval("type Node")) == fingerprint(ip.eval("type Tree"))
+
+
+def test_cached_schemas_and_grammars_match_fresh_ones(ip):
+    schema = JSONSchema(ip)
+    bnf = BNFFormatter(ip)
+    for source in DIFFERENT:
+        value = ip.eval(source)
+        if "->" in source:
+            continue
+        # Schemas of recursive types aren't supported.
+        if source not in ["type Tree", "type Chain"]:
+            assert schema.print_schema(value) == schema._print_schema(value), source
+        assert bnf.format(value) == bnf._format(value), source
+
+
+def test_cache_hits_and_eviction(ip):
+    cache = TypeCache(maxsize=2)
+    calls = []
+
+    def generate(value):
+        calls.append(value)
+        return len(calls)
+
+    assert cache.get("schema", ip.eval("A"), generate) == 1
+    assert cache.get("schema", ip.eval("type {x: Int}"), generate) == 1
+    assert cache.get("grammar", ip.eval("A"), generate) == 2
+    assert cache.get("schema", ip.eval("B"), generate) == 3
+    assert cache.get("schema", ip.eval("A"), generate) == 4
+    assert cache.stats() == {"hits": 1, "misses": 4, "size": 2}
@@ -0,0 +1,108 @@
+import json
+import pytest
+import ms.backend
+from ms.startup import interpreter
+from ms.objects import MValue
+from ms.validator import Validator
+
+
+@pytest.fixture(scope="module")
+def ip():
+    ip = interpreter(interactive=False, backend=ms.backend.LlamaCPP())
+    ip.eval('let Label = type Enum(Str, ["PER", "LOC"])')
+    ip.eval('let Entity = type {text!: Str, label!: Label, start: Int}')
+    ip.eval('let Tree = type {value!: Int, children: [Tree]}')
+    return ip
+
+
+def validator(ip, source: str) -> Validator:
+    return Validator(ip, ip.eval(source))
+
+
+def agrees(ip, source: str, code: str):
+    # The decoded value has the type if and only if the type checker says so.
+    decoded = validator(ip, source).decode(code)
+    value = MValue.wrap(json.loads(code))
+    expected = ip.checktype(value, ip.eval(source))
+    assert (decoded is not None) == expected
+    if decoded is not None:
+        assert decoded.value == value.value or MValue.hashkey(decoded) == MValue.hashkey(value)
+    return decoded
+
+
+@pytest.mark.parametrize("source, code, valid", [
+    ("type Int", "3", True),
+    ("type Int", "3.5", False),
+    ("type Int", "true", False),
+    ("type Num", "3", True),
+    ("type Num", "3.5", True),
+    ("type Bool", "false", True),
+    ("type Str", '"x"', True),
+    ("type Str", "null", False),
+    ("type Null", "null", True),
+    ("type Any", '{"a": [1, null]}', True),
+])
+def test_primitives(ip, source, code, valid):
+    assert (agrees(ip, source, code) is not None) == valid
+
+
+def test_nullable_types_accept_null(ip):
+    assert agrees(ip, "type Int?", "null").value is None
+    assert agrees(ip, "type Int?", "4").value == 4
+    assert agrees(ip, "type Int?", '"4"') is None
+
+
+def test_arrays_check_every_item(ip):
+    decoded = agrees(ip, "type [Int]", "[1, 2, 3]")
+    assert [item.value for item in decoded.value] == [1, 2, 3]
+    assert agrees(ip, "type [Int]", "[1, 2.5]") is None
+    assert agrees(ip, "type [Int]", "[]") is not None
+    assert agrees(ip, "type [Int]", "1") is None
+
+
+def test_maps_need_required_fields_and_check_known_ones(ip):
+    assert agrees(ip, "type Entity", '{"text": "Ann", "label": "PER"}') is not None
+    assert agrees(ip, "type Entity", '{"text": "Ann", "label": "PER", "start": 0}') is not None
+    assert agrees(ip, "type Entity", '{"text": "Ann"}') is None
+    assert agrees(ip, "type Entity", '{"text": "Ann", "label": "PER", "start": "0"}') is None
+    decoded = agrees(ip, "type Entity", '{"text": "Ann", "label": "PER", "extra": [1]}')
+    assert [item.value for item in decoded.value["extra"].value] == [1]
+
+
+def test_enums_use_the_type_index(ip):
+    assert agrees(ip, "type Label", '"LOC"') is not None
+    assert agrees(ip, "type Label", '"ORG"') is None
+    assert agrees(ip, "type [Entity]", '[{"text": "Rome", "label": "ORG"}]') is None
+
+
+def test_recursive_types(ip):
+    code = '{"value": 1, "children": [{"value": 2}, {"value": 3, "children": []}]}'
+    assert agrees(ip, "type Tree", code) is not None
+    assert agrees(ip, "type Tree", '{"value": 1, "children": [{"children": []}]}') is None
+
+
+def test_replies_that_arent_json_give_none(ip):
+    assert validator(ip, "type Int").decode("not json") is None
+    assert validator(ip, "type Int").decode(None) is None
+
+
+def test_types_without_compiled_checks_fall_back_to_the_type_checker(ip):
+    double = ip.eval("fun(x: Int) -> Int do return(2 * x) end")
+    assert validator(ip, "type Int -> Int").check(double)
+    assert not validator(ip, "type Str -> Int").check(double)
+    assert not validator(ip, "type Int -> Int").check(MValue(1, None))
+    assert validator(ip, "type Int -> Int").decode("1") is None
+
+
+def test_check_agrees_with_the_type_checker(ip):
+    values = ['{"text": "Ann", "label": "PER"}', '{"text": "Ann", "label": "ORG"}',
+              '[1, 2]', 'null', '{"value": 1, "children": [{"value": "2"}]}']
+    for source in ["type Entity", "type [Int]", "type Entity?", "type Tree"]:
+        for code in values:
+            value = MValue.wrap(json.loads(code))
+            assert validator(ip, source).check(value) == ip.checktype(value, ip.eval(source))
+
+
+def test_unknown_types_are_left_to_the_type_checker(ip):
+    v = validator(ip, "type Unknown")
+    assert v.decode("1") is None